@@ -10,23 +10,92 @@ load_dotenv()
 import os
 
 from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
 
-from .extensions import db, login_manager, chall_service
+from . import database
+from .cli import data_cli
+from .extensions import (
+    db,
+    login_manager,
+    chall_service,
+    profiler,
+    limiter,
+    password_hasher,
+)
 from .routes import all_bp
 from .models import User
+from .live import cooperative_workers, live_feed
+from .submissions import submission_log
+from .pagecache import page_cache
+from .schema import upgrade_schema
+from .ratelimit import parse_rate
 
 
 def create_app() -> Flask:
     app = Flask(__name__)
     app.config["SQLALCHEMY_DATABASE_URI"] = os.environ["DATABASE_URI"]
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = database.engine_options(
+        os.environ["DATABASE_URI"]
+    )
+    if replica_uri := os.getenv("DATABASE_REPLICA_URI", "").strip():
+        app.config["SQLALCHEMY_BINDS"] = {
+            database.REPLICA: {"url": replica_uri, **database.engine_options(replica_uri)}
+        }
     app.secret_key = os.environ["SECRET_KEY"]
+    # Without this, behind nginx every client has the proxy's address and
+    # shares its per-IP rate limits.
+    trusted_proxies = int(os.getenv("TRUSTED_PROXIES", "0"))
+    if trusted_proxies > 0:
+        app.wsgi_app = ProxyFix(  # type: ignore[method-assign]
+            app.wsgi_app, x_for=trusted_proxies, x_proto=trusted_proxies
+        )
+    app.config["PROFILING"] = os.getenv("PROFILING", "0") == "1"
+    app.config["METRICS_TOKEN"] = os.getenv("METRICS_TOKEN", "")
+    app.config["IDENTITY_CACHE_TTL"] = float(os.getenv("IDENTITY_CACHE_TTL", "30"))
+    app.config["USE_X_SENDFILE"] = os.getenv("USE_X_SENDFILE", "0") == "1"
+    app.config["ATTACHMENT_ACCEL_PREFIX"] = os.getenv("ATTACHMENT_ACCEL_PREFIX", "")
+    app.config["RATE_LIMIT_DB"] = os.getenv("RATE_LIMIT_DB", "ratelimit.db")
+    app.config["RATE_LIMITS"] = {
+        name: {
+            kind: rate
+            for kind, default in kinds.items()
+            if (
+                rate := parse_rate(
+                    os.getenv(f"RATE_LIMIT_{name.upper()}_{kind.upper()}", default)
+                )
+            )
+        }
+        for name, kinds in {
+            "submit": {"user": "10/60", "team": "30/60", "ip": "120/60"},
+            "login": {"ip": "60/60", "username": "5/60"},
+        }.items()
+    }
 
     db.init_app(app)  # type: ignore[no-untyped-call]
+    database.init_app(app)
     login_manager.login_view = "auth.login"
     login_manager.init_app(app)
+    profiler.init_app(app)
+    limiter.init_app(app)
+    password_hasher.init_app(app)
+    live_scoreboard = os.getenv("LIVE_SCOREBOARD", "auto")
+    app.config["LIVE_SCOREBOARD"] = (
+        cooperative_workers() if live_scoreboard == "auto" else live_scoreboard == "1"
+    )
+    app.config["SCOREBOARD_REFRESH"] = int(os.getenv("SCOREBOARD_REFRESH", "0"))
+    live_feed.interval = float(os.getenv("LIVE_POLL_INTERVAL", "1"))
+    live_feed.init_app(app)
+    submission_log.batch_size = int(os.getenv("SUBMISSION_LOG_BATCH", "200"))
+    submission_log.flush_interval = float(os.getenv("SUBMISSION_LOG_INTERVAL", "1"))
+    submission_log.block_timeout = float(os.getenv("SUBMISSION_LOG_BLOCK", "0"))
+    submission_log.init_app(app)
+    page_cache.max_entries = int(os.getenv("PAGE_CACHE_SIZE", "256"))
+    page_cache.shared_path = os.getenv("PAGE_CACHE_DB", "")
+    page_cache.init_app(app)
 
     for bp in all_bp:
         app.register_blueprint(bp)
+    app.cli.add_command(data_cli)
 
     with app.app_context():
         inspector = inspect(db.engine)
@@ -49,7 +118,12 @@ def create_app() -> Flask:
                     print(f"Admin user '{admin_user}' already exists.")
             else:
                 print("ADMIN_USER or ADMIN_PASS not set, skipping admin creation.")
+        else:
+            upgrade_schema()
 
     chall_service.load_challenges()
+    watch_interval = float(os.getenv("CHALLENGE_WATCH_INTERVAL", "0"))
+    if watch_interval > 0:
+        chall_service.watch(watch_interval)
 
     return app
@@ -0,0 +1,497 @@
+"""
+Load-testing benchmark for the core player flows.
+
+    python -m abctf.bench --teams 500 --users 2000 --solves 20000
+
+Seeds a database (a temporary SQLite file unless `--database-uri` is given)
+with synthetic teams, users, challenges and solves, then drives the player
+routes either in-process through the Flask test client or, with `--gunicorn`,
+over HTTP against a local gunicorn, and reports throughput and p50/p99
+latency per route.
+
+With `--streams N`, N live scoreboard streams are held open for the whole run,
+like browsers sitting on the scoreboard page. Comparing `--worker-class sync`
+with `--worker-class gevent` shows how many long-lived connections each mode
+can carry while still serving everyone else.
+"""
+
+import argparse
+import json
+import os
+import random
+import select
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from typing import Callable, Dict, List, Optional, Tuple
+
+from flask import Flask
+from sqlalchemy import insert
+
+BENCH_PASSWORD = "bench"
+
+Route = Tuple[str, str, Callable[[random.Random], str], Optional[Dict[str, str]], bool]
+
+
+def make_challenges(directory: str, count: int) -> List[str]:
+    """Writes `count` static challenges into `directory` and returns their ids."""
+    challenge_ids = []
+    for i in range(count):
+        challenge_id = f"bench{i}"
+        challenge_dir = os.path.join(directory, challenge_id)
+        os.makedirs(challenge_dir, exist_ok=True)
+        with open(os.path.join(challenge_dir, "chall.json"), "w") as f:
+            json.dump(
+                {
+                    "id": challenge_id,
+                    "title": f"Benchmark Challenge {i}",
+                    "category": f"Category {i % 5}",
+                    "points": 100 + 10 * i,
+                    "flag": f"flag{{{challenge_id}}}",
+                },
+                f,
+            )
+        with open(os.path.join(challenge_dir, "chall.py"), "w") as f:
+            f.write(
+                "from abctf.chall import StaticChall\n\n\n"
+                "class Challenge(StaticChall):\n    pass\n"
+            )
+        with open(os.path.join(challenge_dir, "description.md"), "w") as f:
+            f.write(f"# Challenge {i}\n\nSome *benchmark* text.\n" * 20)
+        challenge_ids.append(challenge_id)
+    return challenge_ids
+
+
+def seed(
+    app: Flask,
+    num_teams: int,
+    num_users: int,
+    num_solves: int,
+    challenge_ids: List[str],
+    rng: random.Random,
+) -> None:
+    """
+    Bulk-inserts teams, users (round-robin across teams, all sharing one
+    password hash) and random solves, then rebuilds the derived tables.
+    """
+    from .extensions import db, password_hasher
+    from .models import (
+        Solve,
+        Team,
+        User,
+        rebuild_challenge_stats,
+        rebuild_score_history,
+        rebuild_standings,
+    )
+
+    with app.app_context():
+        password_hash = password_hasher.hash(BENCH_PASSWORD)
+        db.session.execute(
+            insert(Team),
+            [{"id": t + 1, "name": f"team{t}"} for t in range(num_teams)],
+        )
+        db.session.execute(
+            insert(User),
+            [
+                {
+                    "id": u + 1,
+                    "username": f"bench{u}",
+                    "password_hash": password_hash,
+                    "team_id": u % num_teams + 1,
+                }
+                for u in range(num_users)
+            ],
+        )
+
+        solved = set()
+        rows = []
+        max_solves = num_teams * len(challenge_ids)
+        while len(rows) < min(num_solves, max_solves):
+            team_id = rng.randrange(num_teams) + 1
+            challenge_id = rng.choice(challenge_ids)
+            if (team_id, challenge_id) in solved:
+                continue
+            solved.add((team_id, challenge_id))
+            members = range(team_id - 1, num_users, num_teams)
+            rows.append(
+                {
+                    "challenge_id": challenge_id,
+                    "team_id": team_id,
+                    "user_id": rng.choice(members) + 1,
+                    "points_awarded": 100,
+                }
+            )
+        for i in range(0, len(rows), 5000):
+            db.session.execute(insert(Solve), rows[i : i + 5000])
+        db.session.commit()
+
+        rebuild_standings()
+        rebuild_challenge_stats()
+        rebuild_score_history()
+
+
+def make_routes(challenge_ids: List[str]) -> List[Route]:
+    """
+    The player flows to benchmark as (name, method, path factory, form data,
+    anonymous). Submissions use a wrong flag so the database stays unchanged
+    between runs.
+    """
+    return [
+        ("GET /scoreboard", "GET", lambda rng: "/scoreboard", None, False),
+        ("GET /challenges/", "GET", lambda rng: "/challenges/", None, False),
+        (
+            "GET /challenges/<id>",
+            "GET",
+            lambda rng: f"/challenges/{rng.choice(challenge_ids)}",
+            None,
+            False,
+        ),
+        (
+            "POST /challenges/<id>/submit",
+            "POST",
+            lambda rng: f"/challenges/{rng.choice(challenge_ids)}/submit",
+            {"flag": "flag{wrong}"},
+            False,
+        ),
+        (
+            "POST /login",
+            "POST",
+            lambda rng: "/login",
+            {"username": "bench0", "password": BENCH_PASSWORD},
+            True,
+        ),
+    ]
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[int(fraction * (len(ordered) - 1))]
+
+
+def run_test_client(
+    app: Flask, routes: List[Route], num_requests: int, rng: random.Random
+) -> Dict[str, Tuple[List[float], float]]:
+    """Drives each route sequentially through the Flask test client."""
+    client = app.test_client()
+    client.post("/login", data={"username": "bench0", "password": BENCH_PASSWORD})
+    anonymous = app.test_client(use_cookies=False)
+
+    results = {}
+    for name, method, path, data, is_anonymous in routes:
+        route_client = anonymous if is_anonymous else client
+        samples = []
+        start = time.perf_counter()
+        for _ in range(num_requests):
+            request_start = time.perf_counter()
+            response = route_client.open(path(rng), method=method, data=data)
+            samples.append(time.perf_counter() - request_start)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{name} returned {response.status_code}")
+        results[name] = (samples, time.perf_counter() - start)
+    return results
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+def _http_session(base_url: str, anonymous: bool) -> urllib.request.OpenerDirector:
+    opener = urllib.request.build_opener(
+        urllib.request.HTTPCookieProcessor(CookieJar()), _NoRedirect
+    )
+    if anonymous:
+        return opener
+    _http_request(
+        opener,
+        base_url + "/login",
+        "POST",
+        {"username": "bench0", "password": BENCH_PASSWORD},
+    )
+    return opener
+
+
+HTTP_TIMEOUT = 10.0
+"""Seconds before a request counts as failed, e.g. when no worker is free."""
+
+
+def _http_request(
+    opener: urllib.request.OpenerDirector,
+    url: str,
+    method: str,
+    data: Optional[Dict[str, str]],
+) -> None:
+    body = urllib.parse.urlencode(data).encode() if data is not None else None
+    request = urllib.request.Request(url, data=body, method=method)
+    try:
+        with opener.open(request, timeout=HTTP_TIMEOUT) as r:
+            r.read()
+    except urllib.error.HTTPError as e:
+        if e.code >= 400:
+            raise
+
+
+def _http_worker(
+    base_url: str,
+    route: Route,
+    num_requests: int,
+    seed_value: int,
+    ready: threading.Barrier,
+) -> List[float]:
+    _, method, path, data, is_anonymous = route
+    rng = random.Random(seed_value)
+    try:
+        opener = _http_session(base_url, is_anonymous)
+    except BaseException:
+        ready.abort()
+        raise
+    ready.wait()
+    samples = []
+    for _ in range(num_requests):
+        if is_anonymous:
+            opener = _http_session(base_url, True)
+        request_start = time.perf_counter()
+        _http_request(opener, base_url + path(rng), method, data)
+        samples.append(time.perf_counter() - request_start)
+    return samples
+
+
+def open_streams(host: str, port: int, count: int, wait: float) -> List[socket.socket]:
+    """
+    Opens `count` connections to the live scoreboard stream and returns those
+    that started streaming within `wait` seconds. The rest stay queued on the
+    server and are closed.
+    """
+    pending = []
+    for _ in range(count):
+        sock = socket.create_connection((host, port))
+        sock.sendall(
+            f"GET /scoreboard/stream HTTP/1.1\r\nHost: {host}\r\n\r\n".encode()
+        )
+        pending.append(sock)
+
+    streaming = []
+    deadline = time.monotonic() + wait
+    for sock in pending:
+        sock.settimeout(max(deadline - time.monotonic(), 0.01))
+        try:
+            if sock.recv(4096):
+                streaming.append(sock)
+                continue
+        except OSError:
+            pass
+        sock.close()
+    return streaming
+
+
+def _drain(streams: List[socket.socket], stop: threading.Event) -> None:
+    """Reads and discards stream data so the server never blocks on a full buffer."""
+    open_streams = list(streams)
+    for sock in open_streams:
+        sock.setblocking(False)
+    while open_streams and not stop.is_set():
+        readable, _, _ = select.select(open_streams, [], [], 0.5)
+        for sock in readable:
+            try:
+                if sock.recv(65536):
+                    continue
+            except BlockingIOError:
+                continue
+            except OSError:
+                pass
+            open_streams.remove(sock)
+    lost = len(streams) - len(open_streams)
+    if lost and not stop.is_set():
+        print(f"{lost} scoreboard streams were closed by the server")
+
+
+def run_http(
+    base_url: str,
+    routes: List[Route],
+    num_requests: int,
+    concurrency: int,
+    seed_value: int,
+) -> Dict[str, Tuple[List[float], float]]:
+    """
+    Drives each route over HTTP from `concurrency` threads. A route whose
+    requests fail (e.g. time out) is reported with no samples.
+    """
+    per_thread = max(1, num_requests // concurrency)
+    results = {}
+    for route in routes:
+        ready = threading.Barrier(concurrency + 1)
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [
+                executor.submit(
+                    _http_worker,
+                    base_url,
+                    route,
+                    per_thread,
+                    seed_value + index,
+                    ready,
+                )
+                for index in range(concurrency)
+            ]
+            try:
+                ready.wait()
+            except threading.BrokenBarrierError:
+                pass
+            start = time.perf_counter()
+            try:
+                samples = [sample for f in futures for sample in f.result()]
+            except (OSError, threading.BrokenBarrierError) as e:
+                print(f"{route[0]} failed: {e}")
+                samples = []
+        results[route[0]] = (samples, time.perf_counter() - start)
+    return results
+
+
+def start_gunicorn(
+    port: int, workers: int, worker_class: str, extra_args: List[str]
+) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "abctf.wsgi:app",
+            "--bind",
+            f"127.0.0.1:{port}",
+            "--workers",
+            str(workers),
+            "--worker-class",
+            worker_class,
+            *extra_args,
+        ],
+        env=os.environ.copy(),
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("gunicorn did not start within 30 seconds")
+
+
+def report(results: Dict[str, Tuple[List[float], float]]) -> str:
+    lines = [
+        f"{'route':<32} {'requests':>9} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}",
+    ]
+    for name, (samples, elapsed) in results.items():
+        if not samples:
+            lines.append(f"{name:<32} {'failed':>9}")
+            continue
+        lines.append(
+            f"{name:<32} {len(samples):>9} {len(samples) / elapsed:>9.1f} "
+            f"{percentile(samples, 0.5) * 1000:>9.2f} {percentile(samples, 0.99) * 1000:>9.2f}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--teams", type=int, default=200)
+    parser.add_argument("--users", type=int, default=800)
+    parser.add_argument("--solves", type=int, default=5000)
+    parser.add_argument("--challenges", type=int, default=30)
+    parser.add_argument("--requests", type=int, default=500, help="per route")
+    parser.add_argument("--database-uri", help="defaults to a temporary SQLite file")
+    parser.add_argument("--seed", type=int, default=1337)
+    parser.add_argument(
+        "--gunicorn", action="store_true", help="benchmark a local gunicorn over HTTP"
+    )
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument(
+        "--worker-class", default="sync", help="gunicorn worker class, e.g. gevent"
+    )
+    parser.add_argument(
+        "--streams",
+        type=int,
+        default=0,
+        help="live scoreboard streams to hold open during the run (--gunicorn only)",
+    )
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--gunicorn-arg",
+        action="append",
+        default=[],
+        help="extra argument passed to gunicorn, may be repeated",
+    )
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="abctf-bench-")
+    challenge_dir = os.path.join(workdir, "challs")
+    os.environ["DATABASE_URI"] = args.database_uri or f"sqlite:///{workdir}/bench.db"
+    os.environ["CHALLENGE_DIR"] = challenge_dir
+    os.environ.setdefault("SECRET_KEY", "bench")
+    os.environ["ADMIN_USER"] = ""
+    os.environ["ADMIN_PASS"] = ""
+    # Measure the handlers themselves, not how fast the limiter says no.
+    os.environ["RATE_LIMIT_DB"] = os.path.join(workdir, "ratelimit.db")
+    for name in ("SUBMIT_USER", "SUBMIT_TEAM", "SUBMIT_IP", "LOGIN_IP", "LOGIN_USERNAME"):
+        os.environ[f"RATE_LIMIT_{name}"] = "0"
+    if args.streams:
+        # Serve the streams in sync mode too, to show what they cost there.
+        os.environ["LIVE_SCOREBOARD"] = "1"
+
+    from . import create_app
+    from .extensions import chall_service
+
+    rng = random.Random(args.seed)
+    challenge_ids = make_challenges(challenge_dir, args.challenges)
+    chall_service.challenges_dir = challenge_dir
+    app = create_app()
+    seed(app, args.teams, args.users, args.solves, challenge_ids, rng)
+    print(
+        f"Seeded {args.teams} teams, {args.users} users, {args.solves} solves "
+        f"and {args.challenges} challenges into {os.environ['DATABASE_URI']}"
+    )
+
+    routes = make_routes(challenge_ids)
+    if args.gunicorn:
+        process = start_gunicorn(
+            args.port, args.workers, args.worker_class, args.gunicorn_arg
+        )
+        streams: List[socket.socket] = []
+        stop = threading.Event()
+        try:
+            if args.streams:
+                streams = open_streams("127.0.0.1", args.port, args.streams, wait=5)
+                print(
+                    f"{len(streams)} of {args.streams} scoreboard streams connected "
+                    f"({args.worker_class} workers)"
+                )
+                threading.Thread(target=_drain, args=(streams, stop), daemon=True).start()
+            results = run_http(
+                f"http://127.0.0.1:{args.port}",
+                routes,
+                args.requests,
+                args.concurrency,
+                args.seed,
+            )
+        finally:
+            stop.set()
+            for sock in streams:
+                sock.close()
+            process.terminate()
+            process.wait()
+    else:
+        results = run_test_client(app, routes, args.requests, rng)
+
+    print(report(results))
+
+
+if __name__ == "__main__":
+    main()
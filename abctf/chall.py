@@ -1,16 +1,70 @@
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+import hashlib
 import importlib
 import json
+import math
 import os
-from typing import Dict, Optional
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
 import markdown
 
 
+class Attachment:
+    """
+    A file shipped with a challenge, listed under `attachments` in
+    `chall.json` as paths relative to the challenge directory:
+
+        {"attachments": ["dist/server.bin", "capture.pcap"]}
+
+    The digest is computed the first time a page or download needs it, and is
+    recomputed after the file is edited, since that changes the challenge's
+    directory signature and the challenge is reloaded.
+    """
+
+    def __init__(self, challenge_dir: str, relpath: str) -> None:
+        root = os.path.realpath(challenge_dir)
+        path = os.path.realpath(os.path.join(root, relpath))
+        if os.path.commonpath([root, path]) != root:
+            raise ValueError(
+                f"Attachment {relpath!r} is outside the challenge directory"
+            )
+        self.name = os.path.basename(path)
+        self.path = path
+        self.relpath = os.path.relpath(path, root)
+        self.size = os.path.getsize(path)
+
+    @cached_property
+    def digest(self) -> str:
+        """The file's SHA-256, hex encoded."""
+        with open(self.path, "rb") as f:
+            return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def load_attachments(metadata: dict, challenge_dir: str) -> Dict[str, Attachment]:
+    """Checks a challenge's attachments, by file name."""
+    attachments: Dict[str, Attachment] = {}
+    for relpath in metadata.get("attachments", []):
+        attachment = Attachment(challenge_dir, relpath)
+        if attachment.name in attachments:
+            raise ValueError(f"Two attachments are named {attachment.name!r}")
+        attachments[attachment.name] = attachment
+    return attachments
+
+
 class BaseChall(ABC):
     """
     This is the interface that every challenge's Python file must implement.
     """
 
+    rescore_solves: bool = False
+    """
+    Whether every existing solve should be re-valued at `value()` whenever the
+    challenge is solved again, instead of keeping the points it was awarded.
+    """
+
     def __init__(self, metadata: dict, challenge_dir: str):
         self.id = metadata["id"]
         self.title = metadata["title"]
@@ -18,16 +72,35 @@ class BaseChall(ABC):
         self.points = metadata["points"]
         self._metadata = metadata
         self._challenge_dir = challenge_dir
+        self._description_cache: Optional[Tuple[Tuple[int, int], str]] = None
+        self.attachments: Dict[str, Attachment] = {}
+        """Set by `ChallengeService` when the challenge is loaded."""
+
+    @property
+    def sandboxed(self) -> bool:
+        """Whether `solve()` should run in a separate checker process."""
+        return bool(self._metadata.get("sandbox", False))
 
     @property
     def description(self) -> str:
-        """Reads and renders the description markdown file."""
+        """
+        Reads and renders the description markdown file. The rendered HTML is
+        cached until the file's mtime or size changes.
+        """
         desc_file = self._metadata.get("description_file", "description.md")
+        desc_path = f"{self._challenge_dir}/{desc_file}"
         try:
-            with open(f"{self._challenge_dir}/{desc_file}", "r") as f:
-                return markdown.markdown(f.read())
+            stat = os.stat(desc_path)
+            key = (stat.st_mtime_ns, stat.st_size)
+            if self._description_cache and self._description_cache[0] == key:
+                return self._description_cache[1]
+            with open(desc_path, "r") as f:
+                rendered = markdown.markdown(f.read())
         except FileNotFoundError:
+            self._description_cache = None
             return "Description not found for this challenge."
+        self._description_cache = (key, rendered)
+        return rendered
 
     @abstractmethod
     def solve(self, submitted_flag: str) -> bool:
@@ -57,41 +130,263 @@ class StaticChall(BaseChall):
         return self._metadata.get("points", 0)
 
 
+class DynamicChall(StaticChall):
+    """
+    A challenge with a static flag whose value decays quadratically from
+    `points` to `minimum` over its first `decay` solves. Every team's solve is
+    rescored to the current value, so earlier solvers lose points too.
+
+        {"points": 500, "minimum": 100, "decay": 50, "flag": "flag{...}"}
+    """
+
+    rescore_solves = True
+
+    def value(self, num_solves: int) -> int:
+        initial = self._metadata.get("points", 0)
+        minimum = self._metadata.get("minimum", 0)
+        decay = self._metadata.get("decay", 0)
+        if decay <= 0:
+            return initial
+        decayed = initial + (minimum - initial) / decay**2 * num_solves**2
+        return max(minimum, math.ceil(decayed))
+
+
+class LazyChall(BaseChall):
+    """
+    Stand-in for a challenge whose module has not been imported yet. Metadata
+    and the description are served straight from `chall.json`; the first call
+    to `solve()`/`value()` (or any attribute the stand-in does not know about)
+    imports `chall.py` and delegates to the real challenge from then on.
+    """
+
+    def __init__(self, metadata: dict, challenge_dir: str):
+        super().__init__(metadata, challenge_dir)
+        self._instance: Optional[BaseChall] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> BaseChall:
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    start = time.perf_counter()
+                    self._instance = import_challenge(
+                        self._metadata, self._challenge_dir
+                    )
+                    elapsed = (time.perf_counter() - start) * 1000
+                    print(
+                        f"  [+] Imported challenge module: {self.title} ({self.id}) in {elapsed:.1f} ms"
+                    )
+        return self._instance
+
+    def solve(self, submitted_flag: str) -> bool:
+        return self._load().solve(submitted_flag)
+
+    def value(self, num_solves: int) -> int:
+        return self._load().value(num_solves)
+
+    @property
+    def rescore_solves(self) -> bool:  # type: ignore[override]
+        return self._load().rescore_solves
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._load(), name)
+
+
+def import_challenge(metadata: dict, challenge_dir: str) -> BaseChall:
+    """Imports a challenge's `chall.py` and instantiates its `Challenge` class."""
+    spec = importlib.util.spec_from_file_location(
+        name=f"challenge_module_{metadata['id']}",
+        location=f"{challenge_dir}/chall.py",
+    )
+    challenge_module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(challenge_module)
+
+    challenge_class = challenge_module.Challenge
+    return challenge_class(metadata, challenge_dir)
+
+
+def _dir_signature(challenge_dir: str) -> Tuple[Tuple[str, int, int], ...]:
+    """Cheap fingerprint of every file in a challenge directory, used to detect edits."""
+    entries = []
+    for root, dirs, files in os.walk(challenge_dir):
+        dirs[:] = [d for d in dirs if d != "__pycache__"]
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(sorted(entries))
+
+
 class ChallengeService:
-    def __init__(self, challenges_dir="challenges"):
+    def __init__(self, challenges_dir="challenges", lazy=False, workers=None):
+        """
+        :param challenges_dir: Directory containing one subdirectory per challenge.
+        :param lazy: Only read `chall.json` at load time and defer importing
+            `chall.py` until the challenge is first solved or valued.
+        :param workers: Number of threads used to load challenges. `None` or
+            `1` loads them serially.
+        """
         self.challenges_dir = challenges_dir
+        self.lazy = lazy
+        self.workers = workers
         self._challenges: Dict[str, BaseChall] = {}
+        self.load_times: Dict[str, float] = {}
+        """Milliseconds spent loading each challenge directory on the last load."""
+        self._dir_signatures: Dict[str, Tuple[Tuple[str, int, int], ...]] = {}
+        self._dir_ids: Dict[str, str] = {}
+        self._reload_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self.version = ""
+        """
+        Digest of every challenge file's path, mtime and size. Identical across
+        workers serving the same files, and changes whenever a challenge does.
+        """
+
+    def _update_version(self) -> None:
+        digest = hashlib.sha1(repr(sorted(self._dir_signatures.items())).encode())
+        self.version = digest.hexdigest()[:16]
+
+    def _load_challenge_dir(self, challenge_dir_path: str) -> BaseChall:
+        with open(f"{challenge_dir_path}/chall.json", "r") as f:
+            metadata = json.load(f)
+
+        if self.lazy:
+            instance: BaseChall = LazyChall(metadata, challenge_dir_path)
+        else:
+            instance = import_challenge(metadata, challenge_dir_path)
+        instance.attachments = load_attachments(metadata, challenge_dir_path)
+        return instance
+
+    def _timed_load(
+        self, challenge_dir_path: str
+    ) -> Tuple[str, Optional[BaseChall], float]:
+        start = time.perf_counter()
+        try:
+            instance: Optional[BaseChall] = self._load_challenge_dir(challenge_dir_path)
+        except Exception as e:
+            print(f"  [!] Failed to load challenge from {challenge_dir_path}: {e}")
+            instance = None
+        return challenge_dir_path, instance, (time.perf_counter() - start) * 1000
+
+    def _scan_dirs(self) -> List[str]:
+        return [
+            entry.path for entry in os.scandir(self.challenges_dir) if entry.is_dir()
+        ]
 
     def load_challenges(self):
         print("--- Loading all challenges ---")
-        self._challenges = {}
-        for entry in os.scandir(self.challenges_dir):
-            if entry.is_dir():
-                challenge_dir_path = entry.path
-                try:
-                    with open(f"{challenge_dir_path}/chall.json", "r") as f:
-                        metadata = json.load(f)
+        start = time.perf_counter()
+        challenge_dirs = self._scan_dirs()
+        signatures = {path: _dir_signature(path) for path in challenge_dirs}
 
-                    challenge_id = metadata["id"]
+        if self.workers and self.workers > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                results = list(executor.map(self._timed_load, challenge_dirs))
+        else:
+            results = [self._timed_load(path) for path in challenge_dirs]
 
-                    spec = importlib.util.spec_from_file_location(
-                        name=f"challenge_module_{challenge_id}",
-                        location=f"{challenge_dir_path}/chall.py",
-                    )
-                    challenge_module = importlib.util.module_from_spec(spec)
-                    spec.loader.exec_module(challenge_module)
+        challenges: Dict[str, BaseChall] = {}
+        load_times: Dict[str, float] = {}
+        dir_ids: Dict[str, str] = {}
+        for challenge_dir_path, instance, elapsed in results:
+            load_times[challenge_dir_path] = elapsed
+            if instance is None:
+                continue
+            challenges[instance.id] = instance
+            dir_ids[challenge_dir_path] = instance.id
+            print(
+                f"  [+] Loaded challenge: {instance.title} ({instance.id}) in {elapsed:.1f} ms"
+            )
+
+        with self._reload_lock:
+            self._challenges = challenges
+            self.load_times = load_times
+            self._dir_signatures = signatures
+            self._dir_ids = dir_ids
+            self._update_version()
+
+        total = (time.perf_counter() - start) * 1000
+        print(
+            f"--- Challenge loading complete: {len(challenges)} loaded in {total:.1f} ms ---"
+        )
+        for challenge_dir_path, elapsed in sorted(
+            load_times.items(), key=lambda item: item[1], reverse=True
+        )[:5]:
+            print(f"  [~] {elapsed:8.1f} ms  {challenge_dir_path}")
+
+    def reload_changed(self) -> List[str]:
+        """
+        Reloads only the challenge directories that were added, edited or
+        removed since the last load, then swaps the new challenge map in with a
+        single assignment so in-flight requests never see a partial state.
+
+        :return: The challenge directories that were reloaded or dropped.
+        """
+        with self._reload_lock:
+            current = {path: _dir_signature(path) for path in self._scan_dirs()}
+            changed = [
+                path
+                for path, signature in current.items()
+                if self._dir_signatures.get(path) != signature
+            ]
+            removed = [path for path in self._dir_signatures if path not in current]
+            if not changed and not removed:
+                return []
 
-                    challenge_class = challenge_module.Challenge
-                    instance = challenge_class(metadata, challenge_dir_path)
+            challenges = dict(self._challenges)
+            for path in changed + removed:
+                old_id = self._dir_ids.pop(path, None)
+                if old_id is not None:
+                    challenges.pop(old_id, None)
 
-                    self._challenges[instance.id] = instance
-                    print(f"  [+] Loaded challenge: {instance.title} ({instance.id})")
+            for path in removed:
+                del self._dir_signatures[path]
+                self.load_times.pop(path, None)
+                print(f"  [-] Removed challenge directory: {path}")
 
+            for path in changed:
+                _, instance, elapsed = self._timed_load(path)
+                self._dir_signatures[path] = current[path]
+                self.load_times[path] = elapsed
+                if instance is None:
+                    continue
+                challenges[instance.id] = instance
+                self._dir_ids[path] = instance.id
+                print(
+                    f"  [+] Reloaded challenge: {instance.title} ({instance.id}) in {elapsed:.1f} ms"
+                )
+
+            self._challenges = challenges
+            self._update_version()
+            return changed + removed
+
+    def watch(self, interval: float = 2.0) -> None:
+        """
+        Starts a daemon thread that polls the challenge directory every
+        `interval` seconds and calls `reload_changed()`. Every worker process
+        runs its own watcher, so edits reach all of them without a restart.
+        Must be started after forking (i.e. not with gunicorn `--preload`).
+        """
+        if self._watcher is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reload_changed()
                 except Exception as e:
-                    print(
-                        f"  [!] Failed to load challenge from {challenge_dir_path}: {e}"
-                    )
-        print("--- Challenge loading complete ---")
+                    print(f"  [!] Challenge reload failed: {e}")
+
+        self._watcher = threading.Thread(
+            target=run, name="challenge-watcher", daemon=True
+        )
+        self._watcher.start()
 
     def get_all_challenges(self) -> list[BaseChall]:
         return list(self._challenges.values())
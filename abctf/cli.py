@@ -0,0 +1,274 @@
+"""
+`flask data ...` commands for bulk setup and archiving.
+
+    flask --app abctf.wsgi data import players.csv
+    flask --app abctf.wsgi data export solves -o solves.jsonl
+"""
+
+import csv
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import insert, select, update
+
+from .extensions import db, password_hasher
+from .models import (
+    Counter,
+    Solve,
+    Team,
+    TeamStanding,
+    User,
+    bump_counter,
+    get_scoreboard,
+)
+
+data_cli = AppGroup("data", help="Bulk import and export of players, teams and solves.")
+
+FORMATS = ["csv", "jsonl"]
+TRUE_VALUES = {"1", "true", "yes", "y"}
+
+
+def _detect_format(file: IO, fmt: Optional[str]) -> str:
+    if fmt:
+        return fmt
+    name = getattr(file, "name", "")
+    return "csv" if str(name).endswith(".csv") else "jsonl"
+
+
+def read_rows(file: IO, fmt: str) -> Iterator[Dict[str, Any]]:
+    """Yields one dict per CSV row or JSON line, without reading ahead."""
+    if fmt == "csv":
+        yield from csv.DictReader(file)
+        return
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _batches(
+    rows: Iterable[Dict[str, Any]], size: int
+) -> Iterator[List[Dict[str, Any]]]:
+    batch: List[Dict[str, Any]] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _flag(value: Any) -> bool:
+    return str(value or "").strip().lower() in TRUE_VALUES
+
+
+def _field(row: Dict[str, Any], name: str) -> str:
+    return str(row.get(name) or "").strip()
+
+
+def _insert_ids(key, rows: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Bulk inserts `rows` into `key`'s table and returns the new ids by `key`,
+    with RETURNING where the dialect supports it for multi-row inserts.
+    """
+    model = key.class_
+    if db.session.get_bind().dialect.insert_executemany_returning:
+        created = db.session.execute(insert(model).returning(key, model.id), rows)
+        return {name: id_ for name, id_ in created}
+    db.session.execute(insert(model), rows)
+    names = [row[key.key] for row in rows]
+    return dict(db.session.execute(select(key, model.id).where(key.in_(names))).all())
+
+
+def import_batch(
+    rows: List[Dict[str, Any]], pool: ThreadPoolExecutor
+) -> Dict[str, int]:
+    """
+    Creates the teams and users in `rows` with one bulk INSERT each and
+    commits. Existing usernames are skipped and existing team names are
+    joined. A team's captain becomes the first of its rows with `captain`
+    set, or else its first row if the team has no captain yet.
+    """
+    stats = {"teams": 0, "users": 0, "skipped": 0}
+
+    team_names = {_field(row, "team") for row in rows} - {""}
+    team_ids = dict(
+        db.session.execute(
+            select(Team.name, Team.id).where(Team.name.in_(team_names))
+        ).all()
+    )
+    new_teams = sorted(team_names - team_ids.keys())
+    if new_teams:
+        created = _insert_ids(Team.name, [{"name": name} for name in new_teams])
+        db.session.execute(
+            insert(TeamStanding),
+            [{"team_id": team_id, "score": 0} for team_id in created.values()],
+        )
+        team_ids.update(created)
+        stats["teams"] = len(created)
+
+    usernames = [_field(row, "username") for row in rows if _field(row, "username")]
+    seen = set(
+        db.session.execute(select(User.username).where(User.username.in_(usernames)))
+        .scalars()
+        .all()
+    )
+    user_rows = []
+    for row in rows:
+        username = _field(row, "username")
+        if not username:
+            continue
+        if username in seen:
+            stats["skipped"] += 1
+            continue
+        if not row.get("password") and not row.get("password_hash"):
+            raise click.ClickException(f"{username}: needs a password or password_hash")
+        seen.add(username)
+        user_rows.append(row)
+
+    hashes = pool.map(
+        lambda row: row.get("password_hash") or password_hasher.hash(row["password"]),
+        user_rows,
+    )
+    users = [
+        {
+            "username": _field(row, "username"),
+            "password_hash": password_hash,
+            "is_admin": _flag(row.get("is_admin")),
+            "team_id": team_ids.get(_field(row, "team")),
+        }
+        for row, password_hash in zip(user_rows, hashes)
+    ]
+    if users:
+        user_ids = _insert_ids(User.username, users)
+        stats["users"] = len(users)
+
+        captains: Dict[int, int] = {}
+        forced = set()
+        for row in user_rows:
+            team_id = team_ids.get(_field(row, "team"))
+            if team_id is None or team_id in forced:
+                continue
+            if _flag(row.get("captain")):
+                forced.add(team_id)
+                captains[team_id] = user_ids[_field(row, "username")]
+            else:
+                captains.setdefault(team_id, user_ids[_field(row, "username")])
+        captainless = set(
+            db.session.execute(
+                select(Team.id).where(
+                    Team.id.in_(captains.keys()), Team.captain_id.is_(None)
+                )
+            )
+            .scalars()
+            .all()
+        )
+        updates = [
+            {"id": team_id, "captain_id": user_id}
+            for team_id, user_id in captains.items()
+            if team_id in forced or team_id in captainless
+        ]
+        if updates:
+            db.session.execute(update(Team), updates)
+
+    if stats["teams"] or users:
+        bump_counter(Counter.TEAMS)
+    db.session.commit()
+    return stats
+
+
+@data_cli.command("import")
+@click.argument("file", type=click.File("r", encoding="utf-8"))
+@click.option(
+    "--format", "fmt", type=click.Choice(FORMATS), help="Defaults from the file name."
+)
+@click.option("--batch-size", default=500, show_default=True)
+@click.option("--hash-workers", default=os.cpu_count() or 1, show_default=True)
+def import_command(
+    file: IO, fmt: Optional[str], batch_size: int, hash_workers: int
+) -> None:
+    """
+    Imports players and teams from CSV or JSONL (use - for stdin).
+
+    Each row has `username` and either `password` or an existing werkzeug
+    `password_hash`, plus optional `team`, `captain` and `is_admin`. A row with
+    only `team` creates an empty team.
+    """
+    totals = {"teams": 0, "users": 0, "skipped": 0}
+    with ThreadPoolExecutor(hash_workers) as pool:
+        for batch in _batches(read_rows(file, _detect_format(file, fmt)), batch_size):
+            for key, value in import_batch(batch, pool).items():
+                totals[key] += value
+            click.echo(
+                f"  {totals['users']} users, {totals['teams']} teams imported...",
+                err=True,
+            )
+    click.echo(
+        f"Imported {totals['users']} users and {totals['teams']} teams "
+        f"({totals['skipped']} existing users skipped)."
+    )
+
+
+def _export_rows(kind: str) -> Iterator[Dict[str, Any]]:
+    if kind == "scoreboard":
+        yield from get_scoreboard(db.session)
+        return
+
+    if kind == "users":
+        query = (
+            select(User.id, User.username, User.is_admin, Team.name.label("team"))
+            .outerjoin(Team, Team.id == User.team_id)
+            .order_by(User.id)
+        )
+    elif kind == "teams":
+        query = (
+            select(
+                Team.id,
+                Team.name,
+                User.username.label("captain"),
+                TeamStanding.score,
+            )
+            .outerjoin(User, User.id == Team.captain_id)
+            .outerjoin(TeamStanding, TeamStanding.team_id == Team.id)
+            .order_by(Team.id)
+        )
+    else:
+        query = (
+            select(
+                Solve.id,
+                Solve.challenge_id,
+                Solve.points_awarded,
+                Solve.created_at,
+                Team.name.label("team"),
+                User.username,
+            )
+            .join(Team, Team.id == Solve.team_id)
+            .join(User, User.id == Solve.user_id)
+            .order_by(Solve.id)
+        )
+    for row in db.session.execute(query.execution_options(yield_per=1000)):
+        yield row._asdict()
+
+
+@data_cli.command("export")
+@click.argument("kind", type=click.Choice(["users", "teams", "solves", "scoreboard"]))
+@click.option("-o", "--output", type=click.File("w", encoding="utf-8"), default="-")
+@click.option(
+    "--format", "fmt", type=click.Choice(FORMATS), help="Defaults from the file name."
+)
+def export_command(kind: str, output: IO, fmt: Optional[str]) -> None:
+    """Streams users, teams, solves or the scoreboard out as CSV or JSONL."""
+    fmt = _detect_format(output, fmt)
+    writer: Optional[csv.DictWriter] = None
+    for row in _export_rows(kind):
+        if fmt == "jsonl":
+            output.write(json.dumps(row, default=str) + "\n")
+            continue
+        if writer is None:
+            writer = csv.DictWriter(output, fieldnames=list(row))
+            writer.writeheader()
+        writer.writerow(row)
@@ -0,0 +1,165 @@
+"""
+Engine tuning and read replica routing for the main database.
+"""
+
+import os
+import time
+from typing import Any, Dict, Iterable
+
+from flask import Flask, g
+from sqlalchemy import ColumnElement, Engine, event, or_
+from sqlalchemy.orm import Session
+
+from .extensions import db
+
+REPLICA = "replica"
+"""Bind key of the optional read replica (`DATABASE_REPLICA_URI`)."""
+
+
+def engine_options(uri: str) -> Dict[str, Any]:
+    """
+    `SQLALCHEMY_ENGINE_OPTIONS` from the `DB_*` environment variables. Pool
+    options are only passed when set, since in-memory SQLite uses a pool that
+    rejects them.
+    """
+    options: Dict[str, Any] = {}
+    for env, key, cast in (
+        ("DB_POOL_SIZE", "pool_size", int),
+        ("DB_MAX_OVERFLOW", "max_overflow", int),
+        ("DB_POOL_TIMEOUT", "pool_timeout", float),
+        ("DB_POOL_RECYCLE", "pool_recycle", int),
+    ):
+        value = os.getenv(env, "").strip()
+        if value:
+            options[key] = cast(value)
+    if os.getenv("DB_POOL_PRE_PING", "0") == "1":
+        options["pool_pre_ping"] = True
+
+    statement_timeout = os.getenv("DB_STATEMENT_TIMEOUT_MS", "").strip()
+    if statement_timeout and uri.startswith("postgresql"):
+        options["connect_args"] = {
+            "options": f"-c statement_timeout={int(statement_timeout)}"
+        }
+    return options
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    for pragma, env, default in (
+        ("journal_mode", "SQLITE_JOURNAL_MODE", "WAL"),
+        ("synchronous", "SQLITE_SYNCHRONOUS", "NORMAL"),
+        ("busy_timeout", "SQLITE_BUSY_TIMEOUT_MS", "5000"),
+    ):
+        value = os.getenv(env, default).strip()
+        if value:
+            cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+
+
+def _make_psycopg_cooperative() -> None:
+    """
+    psycopg2 waits for PostgreSQL inside C code, which would block every
+    greenlet of a gevent worker. psycogreen (in the `async` extra) makes it
+    yield to the hub instead.
+    """
+    try:
+        from gevent import monkey
+    except ImportError:
+        return
+    if not monkey.is_module_patched("socket"):
+        return
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        print(
+            "  [!] psycogreen is not installed: PostgreSQL queries will block "
+            "the whole gevent worker"
+        )
+        return
+    patch_psycopg()
+
+
+def init_app(app: Flask) -> None:
+    """
+    Applies the SQLite pragmas to every new SQLite connection (WAL lets readers
+    run alongside the writer, and the busy timeout makes concurrent writers
+    wait for the lock instead of failing with "database is locked") and closes
+    replica sessions at the end of each request.
+    """
+    with app.app_context():
+        engines = list(db.engines.values())
+    if any(engine.dialect.driver == "psycopg2" for engine in engines):
+        _make_psycopg_cooperative()
+    for engine in engines:
+        if engine.dialect.name == "sqlite" and not _is_memory(engine):
+            event.listen(engine, "connect", _set_sqlite_pragmas)
+
+    @app.teardown_appcontext
+    def close_replica_session(exception=None) -> None:
+        session = g.pop("_replica_session", None)
+        if session is not None:
+            session.close()
+
+
+def _is_memory(engine: Engine) -> bool:
+    return engine.url.database in (None, "", ":memory:")
+
+
+class NewRows:
+    """
+    Tracks which rows of an append-only table have been read, by primary key.
+
+    Ids are handed out at insert time but rows only become visible at commit,
+    so with concurrent writers (PostgreSQL, not SQLite) a row can show up
+    after higher ids have already been read. Ids skipped over are remembered
+    and looked for again until `gap_timeout` seconds have passed, which must
+    exceed how long a writing transaction can stay open. Ids rolled back for
+    good just expire.
+    """
+
+    max_gap = 1000
+    """At most this many ids below each newly read id are remembered."""
+
+    def __init__(self, gap_timeout: float = 300.0) -> None:
+        self.gap_timeout = gap_timeout
+        self.last_id = 0
+        self._gaps: Dict[int, float] = {}
+
+    def reset(self, last_id: int) -> None:
+        """Skips every row up to `last_id`."""
+        self.last_id = last_id
+        self._gaps.clear()
+
+    def condition(self, id_column) -> ColumnElement[bool]:
+        """Filter for the rows not read yet."""
+        now = time.monotonic()
+        self._gaps = {id_: t for id_, t in self._gaps.items() if t > now}
+        if not self._gaps:
+            return id_column > self.last_id
+        return or_(id_column > self.last_id, id_column.in_(list(self._gaps)))
+
+    def seen(self, ids: Iterable[int]) -> None:
+        """Records the ids of the rows read with `condition()`, ascending."""
+        expires = time.monotonic() + self.gap_timeout
+        for id_ in ids:
+            if self._gaps.pop(id_, None) is not None or id_ <= self.last_id:
+                continue
+            for missing in range(max(self.last_id + 1, id_ - self.max_gap), id_):
+                self._gaps[missing] = expires
+            self.last_id = id_
+
+
+def read_session() -> Session:
+    """
+    Session for reads that may lag the primary by the replica's delay: the
+    scoreboard, solve counts and the version counters cached pages and ETags
+    are keyed on. Falls back to `db.session` without a replica.
+
+    Keep each page's reads on one side, so a version is never paired with
+    data older than it.
+    """
+    if REPLICA not in db.engines:
+        return db.session
+    if "_replica_session" not in g:
+        g._replica_session = Session(bind=db.engines[REPLICA])
+    return g._replica_session
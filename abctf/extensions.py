@@ -5,8 +5,29 @@ Module containing Flask extensions.
 import flask_login  # type: ignore[import-untyped]
 from flask_sqlalchemy import SQLAlchemy
 from .chall import ChallengeService
+from .passwords import PasswordHasher
+from .profiling import Profiler
+from .ratelimit import RateLimiter
+from .sandbox import SolveSandbox
 import os
 
-chall_service = ChallengeService(os.getenv("CHALLENGE_DIR", "challs"))
+chall_service = ChallengeService(
+    os.getenv("CHALLENGE_DIR", "challs"),
+    lazy=os.getenv("CHALLENGE_LAZY_LOAD", "0") == "1",
+    workers=int(os.getenv("CHALLENGE_LOAD_WORKERS", "1")),
+)
 login_manager = flask_login.LoginManager()
 db = SQLAlchemy()
+profiler = Profiler()
+solve_sandbox = SolveSandbox(
+    workers=int(os.getenv("SANDBOX_WORKERS", "2")),
+    timeout=float(os.getenv("SANDBOX_TIMEOUT", "5")),
+    memory_mb=int(os.getenv("SANDBOX_MEMORY_MB", "256")),
+)
+limiter = RateLimiter()
+password_hasher = PasswordHasher(
+    method=os.getenv("PASSWORD_HASH_METHOD", "scrypt"),
+    workers=int(os.getenv("PASSWORD_WORKERS", "0")),
+    max_concurrent=int(os.getenv("PASSWORD_MAX_CONCURRENT") or os.cpu_count() or 1),
+    queue_timeout=float(os.getenv("PASSWORD_QUEUE_TIMEOUT", "10")),
+)
@@ -0,0 +1,117 @@
+"""
+In-memory score-over-time series for score graphs.
+"""
+
+import threading
+from array import array
+from bisect import bisect_right
+from datetime import timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .database import NewRows
+from .extensions import db
+from .models import ScoreHistory
+
+
+class ScoreSeries:
+    """A team's score history as two parallel, append-only arrays."""
+
+    __slots__ = ("times", "scores")
+
+    def __init__(self) -> None:
+        self.times = array("d")
+        self.scores = array("q")
+
+    def append(self, at: float, score: int) -> None:
+        if not self.times or at >= self.times[-1]:
+            self.times.append(at)
+            self.scores.append(score)
+            return
+        # A change that committed after later ones had been read.
+        i = bisect_right(self.times, at)
+        self.times.insert(i, at)
+        self.scores.insert(i, score)
+
+    def score_at(self, at: float) -> int:
+        i = bisect_right(self.times, at)
+        return self.scores[i - 1] if i else 0
+
+    def sample(self, start: float, end: float, points: int) -> List[Tuple[float, int]]:
+        """
+        Returns the series between `start` and `end` as at most `points`
+        (time, score) pairs: every change if there are few enough, otherwise
+        the score at evenly spaced times. Either way the cost depends only on
+        `points`, not on how many changes the team has had.
+        """
+        first = bisect_right(self.times, start)
+        last = bisect_right(self.times, end)
+        if last - first + 2 <= points:
+            changes = zip(self.times[first:last], self.scores[first:last])
+            return [(start, self.score_at(start)), *changes, (end, self.score_at(end))]
+        step = (end - start) / (points - 1)
+        return [
+            (start + i * step, self.score_at(start + i * step)) for i in range(points)
+        ]
+
+
+class ScoreHistoryCache:
+    """
+    Per-worker copy of the `score_history` table. `refresh()` only reads rows
+    it has not seen yet (a primary key range scan, see `NewRows`), so keeping
+    it current costs one small query per new solve rather than per request.
+    """
+
+    def __init__(self) -> None:
+        self._series: Dict[int, ScoreSeries] = {}
+        self._new_rows = NewRows()
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def refresh(self, version: int) -> None:
+        """Loads new rows unless already up to date with solve counter `version`."""
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            rows = (
+                db.session.query(
+                    ScoreHistory.id,
+                    ScoreHistory.team_id,
+                    ScoreHistory.at,
+                    ScoreHistory.score,
+                )
+                .filter(self._new_rows.condition(ScoreHistory.id))
+                .order_by(ScoreHistory.id)
+                .all()
+            )
+            for row in rows:
+                series = self._series.get(row.team_id)
+                if series is None:
+                    series = self._series[row.team_id] = ScoreSeries()
+                at = row.at.replace(tzinfo=timezone.utc).timestamp()
+                series.append(at, row.score)
+            self._new_rows.seen(row.id for row in rows)
+            self._version = version
+
+    def span(self) -> Tuple[float, float]:
+        """Times of the first and last recorded score changes (0 if none)."""
+        with self._lock:
+            times = [s.times for s in self._series.values() if s.times]
+            if not times:
+                return 0.0, 0.0
+            return min(t[0] for t in times), max(t[-1] for t in times)
+
+    def sample(
+        self, team_ids: Iterable[int], start: float, end: float, points: int
+    ) -> Dict[int, List[Tuple[float, int]]]:
+        with self._lock:
+            return {
+                team_id: self._series.get(team_id, ScoreSeries()).sample(
+                    start, end, points
+                )
+                for team_id in team_ids
+            }
+
+
+score_history = ScoreHistoryCache()
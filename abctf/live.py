@@ -0,0 +1,220 @@
+"""
+Live scoreboard and solve feed pushed to browsers over Server-Sent Events.
+"""
+
+import json
+import queue
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from flask import Flask
+from sqlalchemy import exists, func
+from sqlalchemy.orm import aliased
+
+from .database import NewRows
+from .extensions import chall_service, db
+from .models import Solve, Team, User, get_scoreboard
+
+
+def cooperative_workers() -> bool:
+    """
+    Whether gevent has patched the standard library, as in the gevent workers
+    of `just serve-async`, so an open stream costs a greenlet and not a worker.
+    """
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("socket")
+
+
+def _event(name: str, data: Any) -> str:
+    return f"event: {name}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class LiveFeed:
+    """
+    Fans scoreboard deltas and solve notifications out to every connected
+    client of this worker.
+
+    A single producer thread per worker polls the solve table for rows it has
+    not seen yet (a primary key range scan, see `NewRows`) and, when there
+    are any, re-reads the materialized standings once and diffs them against
+    its previous snapshot. Each subscriber only ever reads from its own
+    in-memory queue, so the database cost is independent of the number of open
+    connections. Submissions handled by this worker call `notify()` to wake the
+    producer immediately; solves made on other workers are picked up within
+    `interval` seconds.
+    """
+
+    def __init__(self, interval: float = 1.0, queue_size: int = 100) -> None:
+        self.interval = interval
+        self.queue_size = queue_size
+        self._app: Optional[Flask] = None
+        self._subscribers: Set["queue.Queue[Optional[str]]"] = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._new_solves = NewRows()
+        self._board: Dict[int, Dict[str, Any]] = {}
+        self._synced = False
+
+    def init_app(self, app: Flask) -> None:
+        self._app = app
+
+    def notify(self) -> None:
+        """Wakes the producer so solves committed by this worker go out at once."""
+        self._wake.set()
+
+    def _start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="live-feed", daemon=True
+            )
+            self._thread.start()
+
+    def subscribe(self) -> "queue.Queue[Optional[str]]":
+        q: "queue.Queue[Optional[str]]" = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._start()
+            if self._synced:
+                q.put_nowait(
+                    _event("scoreboard", {"changed": list(self._board.values())})
+                )
+            self._subscribers.add(q)
+        self._wake.set()
+        return q
+
+    def unsubscribe(self, q: "queue.Queue[Optional[str]]") -> None:
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def _publish(self, message: str) -> None:
+        with self._lock:
+            for q in list(self._subscribers):
+                try:
+                    q.put_nowait(message)
+                except queue.Full:
+                    # Too slow to keep up: end its stream so the browser
+                    # reconnects and resyncs from a full board.
+                    self._subscribers.discard(q)
+                    self._close(q)
+
+    @staticmethod
+    def _close(q: "queue.Queue[Optional[str]]") -> None:
+        """Replaces whatever the client has not read yet with the end marker."""
+        while True:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                break
+        q.put_nowait(None)
+
+    def stream(self) -> Iterator[str]:
+        """
+        Yields SSE messages for one client until it disconnects, or until it
+        falls too far behind and is dropped.
+        """
+        q = self.subscribe()
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    message = q.get(timeout=15)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if message is None:
+                    return
+                yield message
+        finally:
+            self.unsubscribe(q)
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if not self._subscribers:
+                # Nobody is listening: resync quietly on the next poll instead
+                # of replaying every solve missed in the meantime.
+                self._synced = False
+                continue
+            try:
+                assert self._app is not None
+                with self._app.app_context():
+                    self._poll()
+            except Exception as e:
+                print(f"  [!] Live feed poll failed: {e}")
+
+    def _poll(self) -> None:
+        if not self._synced:
+            self._new_solves.reset(
+                db.session.query(func.max(Solve.id)).scalar() or 0
+            )
+            self._publish_board(full=True)
+            self._synced = True
+            return
+
+        earlier = aliased(Solve)
+        new_solves = (
+            db.session.query(
+                Solve.id,
+                Solve.challenge_id,
+                Solve.points_awarded,
+                Solve.created_at,
+                Team.name.label("team_name"),
+                User.username,
+                ~exists()
+                .where(
+                    (earlier.challenge_id == Solve.challenge_id)
+                    & (earlier.id < Solve.id)
+                )
+                .label("first_blood"),
+            )
+            .join(Team, Team.id == Solve.team_id)
+            .join(User, User.id == Solve.user_id)
+            .filter(self._new_solves.condition(Solve.id))
+            .order_by(Solve.id)
+            .all()
+        )
+        if not new_solves:
+            return
+        self._new_solves.seen(solve.id for solve in new_solves)
+
+        for solve in new_solves:
+            challenge = chall_service.get_challenge(solve.challenge_id)
+            self._publish(
+                _event(
+                    "solve",
+                    {
+                        "challenge_id": solve.challenge_id,
+                        "challenge_title": challenge.title if challenge else None,
+                        "team_name": solve.team_name,
+                        "username": solve.username,
+                        "points": solve.points_awarded,
+                        "created_at": solve.created_at,
+                        "first_blood": solve.first_blood,
+                    },
+                )
+            )
+        self._publish_board()
+
+    def _publish_board(self, full: bool = False) -> None:
+        # Read from the primary, like the solves above, so a board is never
+        # older than the solve that triggered it.
+        board = {row["team_id"]: row for row in get_scoreboard(db.session)}
+        changed: List[Dict[str, Any]] = [
+            row
+            for team_id, row in board.items()
+            if full or self._board.get(team_id) != row
+        ]
+        removed = [team_id for team_id in self._board if team_id not in board]
+        with self._lock:
+            self._board = board
+        if changed or removed:
+            self._publish(
+                _event("scoreboard", {"changed": changed, "removed": removed})
+            )
+
+
+live_feed = LiveFeed()
@@ -1,14 +1,31 @@
 from __future__ import annotations
 from datetime import datetime
-from typing import List, Optional
+import time
+from typing import Any, Callable, Dict, List, Optional
 import uuid
 
+from flask import current_app, session
 from flask_login import UserMixin
-from sqlalchemy import ForeignKey, Integer, String, Boolean, desc, func, DateTime
-from sqlalchemy.orm import Mapped, mapped_column, relationship
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import (
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Boolean,
+    desc,
+    func,
+    DateTime,
+    insert,
+    literal,
+    select,
+    update,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Mapped, Session, mapped_column, relationship
 
-from .extensions import db, login_manager
+from .database import read_session
+from .extensions import db, login_manager, password_hasher
 
 
 class Solve(db.Model):
@@ -26,6 +43,17 @@ class Solve(db.Model):
     user: Mapped["User"] = relationship(back_populates="solves", foreign_keys=[user_id])
     team: Mapped["Team"] = relationship(back_populates="solves", foreign_keys=[team_id])
 
+    __table_args__ = (
+        # Duplicate-solve guard; also serves "has this team solved X" and a
+        # team's solve list.
+        Index("ux_solve_team_challenge", team_id, challenge_id, unique=True),
+        # Per-challenge lookups (rescoring, solve lists), covering the points.
+        Index("ix_solve_challenge", challenge_id, team_id, points_awarded),
+        # Covering index for per-team score aggregation and last-solve lookup.
+        Index("ix_solve_team_scoreboard", team_id, created_at, points_awarded, user_id),
+        Index("ix_solve_created_at", created_at),
+    )
+
 
 class Team(db.Model):
     __tablename__ = "team"
@@ -54,17 +82,97 @@ class Team(db.Model):
     @property
     def score(self) -> int:
         """Total current score of the team across all solves."""
-        total = (
-            db.session.query(func.sum(Solve.points_awarded))
-            .filter_by(team_id=self.id)
-            .scalar()
-        )
+        total = db.session.query(TeamStanding.score).filter_by(team_id=self.id).scalar()
         return total or 0
 
     def __repr__(self) -> str:
         return f"<Team {self.name}>"
 
 
+class TeamStanding(db.Model):
+    """
+    Materialized scoreboard row for a team, updated in place whenever the team
+    solves a challenge so the scoreboard never has to aggregate the solve table.
+    """
+
+    __tablename__ = "team_standing"
+    team_id: Mapped[int] = mapped_column(ForeignKey("team.id"), primary_key=True)
+    score: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    last_solve_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    last_solve_by: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
+
+    team: Mapped["Team"] = relationship("Team")
+
+    __table_args__ = (Index("ix_team_standing_rank", desc(score), last_solve_at),)
+
+
+class ChallengeStats(db.Model):
+    """Per-challenge solve counter, bumped in the same transaction as each solve."""
+
+    __tablename__ = "challenge_stats"
+    challenge_id: Mapped[str] = mapped_column(String(128), primary_key=True)
+    solve_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
+class ScoreHistory(db.Model):
+    """
+    Append-only log of each team's total score after every change, written in
+    the same transaction as the change so score graphs never replay solves.
+    """
+
+    __tablename__ = "score_history"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    team_id: Mapped[int] = mapped_column(ForeignKey("team.id"), nullable=False)
+    at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    score: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    __table_args__ = (Index("ix_score_history_team", team_id, id),)
+
+
+class Counter(db.Model):
+    """
+    Named version counters, bumped in the same transaction as the data they
+    track so they can be used as cheap cache validators (e.g. ETags).
+    """
+
+    __tablename__ = "counter"
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    value: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+    SOLVES = "solves"
+    """Bumped whenever a solve is recorded or scores change."""
+    TEAMS = "teams"
+    """Bumped whenever a team is created or its membership or captain changes."""
+
+
+class Submission(db.Model):
+    """
+    Every flag attempt, right or wrong, kept for auditing. Written in batches by
+    `SubmissionLog`, never in the submitting request.
+    """
+
+    __tablename__ = "submission"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    challenge_id: Mapped[str] = mapped_column(String(128), nullable=False)
+    user_id: Mapped[int] = mapped_column(ForeignKey("user.id"), nullable=False)
+    team_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("team.id"), nullable=True
+    )
+    flag: Mapped[str] = mapped_column(String(256), nullable=False)
+    correct: Mapped[bool] = mapped_column(Boolean, nullable=False)
+    ip: Mapped[Optional[str]] = mapped_column(String(45), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+    user: Mapped["User"] = relationship("User")
+    team: Mapped[Optional["Team"]] = relationship("Team")
+
+    __table_args__ = (
+        Index("ix_submission_challenge", challenge_id, id),
+        Index("ix_submission_team", team_id, id),
+        Index("ix_submission_user", user_id, id),
+    )
+
+
 class User(UserMixin, db.Model):
     __tablename__ = "user"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -86,12 +194,21 @@ class User(UserMixin, db.Model):
     )
 
     def set_password(self, password: str) -> None:
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password: str) -> bool:
+        """
+        Checks `password`, re-hashing it with the current parameters if the
+        stored hash used different ones. The caller must commit the session.
+        May raise `PasswordCheckBusy`.
+        """
         if self.password_hash is None:
             return False
-        return check_password_hash(self.password_hash, password)
+        if not password_hasher.verify(self.password_hash, password):
+            return False
+        if password_hasher.needs_rehash(self.password_hash):
+            self.set_password(password)
+        return True
 
     def is_captain_of(self, team: Team) -> bool:
         return team.captain_id == self.id
@@ -100,56 +217,387 @@ class User(UserMixin, db.Model):
         return f"<User {self.username}>"
 
 
+class CachedUser(UserMixin):
+    """
+    Identity snapshot restored from the session cookie by `load_user`, so most
+    authenticated requests need no query at all. Only carries plain columns;
+    anything that needs relationships or writes must load the real `User`.
+    """
+
+    def __init__(self, snapshot: Dict[str, Any]) -> None:
+        self.id: int = snapshot["id"]
+        self.username: str = snapshot["username"]
+        self.is_admin: bool = snapshot["is_admin"]
+        self.team_id: Optional[int] = snapshot["team_id"]
+
+    def is_captain_of(self, team: Team) -> bool:
+        return team.captain_id == self.id
+
+    def __repr__(self) -> str:
+        return f"<CachedUser {self.username}>"
+
+
+def cache_identity(user: User) -> None:
+    """Snapshots `user` into the session for `IDENTITY_CACHE_TTL` seconds."""
+    ttl = current_app.config.get("IDENTITY_CACHE_TTL", 0)
+    if ttl <= 0:
+        return
+    session["_identity"] = {
+        "id": user.id,
+        "username": user.username,
+        "is_admin": user.is_admin,
+        "team_id": user.team_id,
+        "expires": time.time() + ttl,
+    }
+
+
+def invalidate_identity() -> None:
+    """
+    Drops the current session's identity snapshot. Call after changing the
+    logged in user's own team; other users' snapshots expire within the TTL.
+    """
+    session.pop("_identity", None)
+
+
 @login_manager.user_loader
-def load_user(user_id: str) -> Optional[User]:
-    return User.query.get(int(user_id))
-
-
-def get_scoreboard():
-    """
-    Generates the scoreboard data.
-    Returns a list of dicts: 
-    [{'rank': 1, 'team_name': 'Team A', 'score': 500, 'last_solve_at': datetime, 'last_solve_by': 'user1'}, ...]
-    """
-    latest_solve_subquery = db.session.query(
-        Solve.team_id,
-        func.max(Solve.created_at).label('max_created_at')
-    ).group_by(Solve.team_id).subquery()
-
-    scoreboard_query = db.session.query(
-        Team.name.label('team_name'),
-        func.sum(Solve.points_awarded).label('score'),
-        User.username.label('last_solve_by'),
-        latest_solve_subquery.c.max_created_at.label('last_solve_at')
-    ).join(Solve, Team.id == Solve.team_id)\
-     .join(latest_solve_subquery, Team.id == latest_solve_subquery.c.team_id)\
-     .join(User, Solve.user_id == User.id)\
-     .filter(Solve.created_at == latest_solve_subquery.c.max_created_at)\
-     .group_by(Team.name, User.username, latest_solve_subquery.c.max_created_at)\
-     .order_by(desc('score'), 'last_solve_at')
-
-    all_teams_query = db.session.query(Team.name).all()
-    solved_teams_data = scoreboard_query.all()
-    
-    scoreboard_data = [row._asdict() for row in solved_teams_data]
-    
-    solved_team_names = {row['team_name'] for row in scoreboard_data}
-    
-    for team_name_tuple in all_teams_query:
-        team_name = team_name_tuple[0]
-        if team_name not in solved_team_names:
-            scoreboard_data.append({
-                'team_name': team_name,
-                'score': 0,
-                'last_solve_at': None,
-                'last_solve_by': None
-            })
-
-    scoreboard_data.sort(
-        key=lambda x: (x["score"], (x["last_solve_at"] or datetime.min)), reverse=True
+def load_user(user_id: str) -> Optional[User | CachedUser]:
+    snapshot = session.get("_identity")
+    if (
+        snapshot
+        and snapshot["id"] == int(user_id)
+        and snapshot["expires"] > time.time()
+    ):
+        return CachedUser(snapshot)
+
+    user = db.session.get(User, int(user_id))
+    if user is not None:
+        cache_identity(user)
+    return user
+
+
+def _upsert_insert(model):
+    """A dialect-specific INSERT supporting ON CONFLICT, or `None` if unavailable."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "sqlite":
+        return sqlite.insert(model)
+    if dialect == "postgresql":
+        return postgresql.insert(model)
+    return None
+
+
+def award_solve(
+    challenge_id: str,
+    user_id: int,
+    team_id: int,
+    username: str,
+    value: Callable[[int], int],
+    rescore: bool = False,
+) -> Optional[int]:
+    """
+    Records that `team_id` solved `challenge_id`, folds it into the team's
+    standing and commits, all in one transaction.
+
+    The challenge's solve counter is bumped first, which takes the write lock
+    and serializes concurrent solves of the same challenge, so the points
+    (`value(prior solves)`) are computed from a count nobody else can change
+    before this transaction commits. The solve itself is an insert-or-ignore
+    against the unique (team_id, challenge_id) index, so a team can never be
+    awarded twice. With `rescore`, every earlier solve of the challenge is
+    re-valued to the new points via `rescore_challenge()`.
+
+    :return: The points awarded, or `None` if the team had already solved it.
+    """
+    now = datetime.utcnow()
+    solve_values = {
+        "challenge_id": challenge_id,
+        "user_id": user_id,
+        "team_id": team_id,
+        "created_at": now,
+    }
+
+    stats_insert = _upsert_insert(ChallengeStats)
+    if stats_insert is not None:
+        num_solves = db.session.execute(
+            stats_insert.values(challenge_id=challenge_id, solve_count=1)
+            .on_conflict_do_update(
+                index_elements=[ChallengeStats.challenge_id],
+                set_={"solve_count": ChallengeStats.solve_count + 1},
+            )
+            .returning(ChallengeStats.solve_count)
+        ).scalar_one()
+        points = value(num_solves - 1)
+        solve_id = db.session.execute(
+            _upsert_insert(Solve)
+            .values(points_awarded=points, **solve_values)
+            .on_conflict_do_nothing(index_elements=[Solve.team_id, Solve.challenge_id])
+            .returning(Solve.id)
+        ).scalar()
+        if solve_id is None:
+            db.session.rollback()
+            return None
+    else:
+        result = db.session.execute(
+            update(ChallengeStats)
+            .where(ChallengeStats.challenge_id == challenge_id)
+            .values(solve_count=ChallengeStats.solve_count + 1)
+        )
+        if result.rowcount == 0:
+            db.session.add(ChallengeStats(challenge_id=challenge_id, solve_count=1))
+            db.session.flush()
+        num_solves = get_solve_count(challenge_id)
+        points = value(num_solves - 1)
+        try:
+            with db.session.begin_nested():
+                db.session.execute(
+                    insert(Solve).values(points_awarded=points, **solve_values)
+                )
+        except IntegrityError:
+            db.session.rollback()
+            return None
+
+    result = db.session.execute(
+        update(TeamStanding)
+        .where(TeamStanding.team_id == team_id)
+        .values(
+            score=TeamStanding.score + points,
+            last_solve_at=now,
+            last_solve_by=username,
+        )
+    )
+    if result.rowcount == 0:
+        db.session.add(
+            TeamStanding(
+                team_id=team_id,
+                score=points,
+                last_solve_at=now,
+                last_solve_by=username,
+            )
+        )
+
+    if rescore:
+        rescore_challenge(challenge_id, points)
+        changed = TeamStanding.team_id.in_(
+            select(Solve.team_id).where(Solve.challenge_id == challenge_id)
+        )
+    else:
+        changed = TeamStanding.team_id == team_id
+    record_score_history(changed, now)
+
+    bump_counter(Counter.SOLVES)
+    db.session.commit()
+    return points
+
+
+def bump_counter(name: str) -> None:
+    """Increments a version counter. The caller is responsible for committing."""
+    result = db.session.execute(
+        update(Counter).where(Counter.name == name).values(value=Counter.value + 1)
+    )
+    if result.rowcount == 0:
+        counter_insert = _upsert_insert(Counter)
+        if counter_insert is None:
+            db.session.add(Counter(name=name, value=1))
+            return
+        db.session.execute(
+            counter_insert.values(name=name, value=1).on_conflict_do_update(
+                index_elements=[Counter.name], set_={"value": Counter.value + 1}
+            )
+        )
+
+
+def get_counters(*names: str) -> Dict[str, int]:
+    """
+    Returns the current value of each named version counter in one query,
+    read from the replica if there is one (see `read_session()`).
+    """
+    values = dict(
+        read_session()
+        .query(Counter.name, Counter.value)
+        .filter(Counter.name.in_(names))
+    )
+    return {name: values.get(name, 0) for name in names}
+
+
+def rescore_challenge(challenge_id: str, points: int) -> None:
+    """
+    Sets every solve of `challenge_id` to `points` and moves each affected
+    team's standing by the difference, as two set-based UPDATEs no matter how
+    many solves there are. The caller is responsible for committing.
+    """
+    stale_solves = (Solve.challenge_id == challenge_id) & (
+        Solve.points_awarded != points
+    )
+    old_points = (
+        select(Solve.points_awarded)
+        .where(
+            (Solve.team_id == TeamStanding.team_id)
+            & (Solve.challenge_id == challenge_id)
+        )
+        .scalar_subquery()
+    )
+    db.session.execute(
+        update(TeamStanding)
+        .where(TeamStanding.team_id.in_(select(Solve.team_id).where(stale_solves)))
+        .values(score=TeamStanding.score + points - old_points),
+        execution_options={"synchronize_session": False},
+    )
+    db.session.execute(
+        update(Solve).where(stale_solves).values(points_awarded=points),
+        execution_options={"synchronize_session": False},
     )
 
+
+def record_score_history(teams, at: datetime) -> None:
+    """
+    Appends the current standing score of every team matching the `teams`
+    condition to the score history. The caller is responsible for committing.
+    """
+    db.session.flush()
+    db.session.execute(
+        insert(ScoreHistory).from_select(
+            ["team_id", "at", "score"],
+            select(TeamStanding.team_id, literal(at), TeamStanding.score).where(teams),
+        )
+    )
+
+
+def get_solve_counts() -> Dict[str, int]:
+    """
+    Returns the number of solves of every challenge that has been solved, read
+    from the replica if there is one.
+    """
+    return dict(
+        read_session()
+        .query(ChallengeStats.challenge_id, ChallengeStats.solve_count)
+        .all()
+    )
+
+
+def get_solve_count(challenge_id: str) -> int:
+    """Returns the number of solves of a single challenge."""
+    count = (
+        db.session.query(ChallengeStats.solve_count)
+        .filter_by(challenge_id=challenge_id)
+        .scalar()
+    )
+    return count or 0
+
+
+def _bump_rebuilt() -> None:
+    """
+    Bumps the counters that cached pages and ETags are keyed on, after a
+    derived table has been rebuilt behind their back.
+    """
+    bump_counter(Counter.SOLVES)
+    bump_counter(Counter.TEAMS)
+
+
+def rebuild_standings() -> None:
+    """
+    Recomputes every team's standing from the solve table. Only needed when the
+    standings table is first created or has been tampered with by hand.
+    """
+    db.session.execute(TeamStanding.__table__.delete())
+
+    latest_solve_subquery = (
+        db.session.query(
+            Solve.team_id, func.max(Solve.created_at).label("max_created_at")
+        )
+        .group_by(Solve.team_id)
+        .subquery()
+    )
+    totals = dict(
+        db.session.query(Solve.team_id, func.sum(Solve.points_awarded))
+        .group_by(Solve.team_id)
+        .all()
+    )
+    latest = {
+        row.team_id: (row.created_at, row.username)
+        for row in db.session.query(Solve.team_id, Solve.created_at, User.username)
+        .join(User, Solve.user_id == User.id)
+        .join(
+            latest_solve_subquery,
+            (Solve.team_id == latest_solve_subquery.c.team_id)
+            & (Solve.created_at == latest_solve_subquery.c.max_created_at),
+        )
+    }
+
+    rows = []
+    for (team_id,) in db.session.query(Team.id):
+        last_solve_at, last_solve_by = latest.get(team_id, (None, None))
+        rows.append(
+            {
+                "team_id": team_id,
+                "score": totals.get(team_id) or 0,
+                "last_solve_at": last_solve_at,
+                "last_solve_by": last_solve_by,
+            }
+        )
+    if rows:
+        db.session.execute(insert(TeamStanding), rows)
+    _bump_rebuilt()
+    db.session.commit()
+
+
+def rebuild_challenge_stats() -> None:
+    """Recomputes every challenge's solve counter from the solve table."""
+    db.session.execute(ChallengeStats.__table__.delete())
+    rows = [
+        {"challenge_id": challenge_id, "solve_count": count}
+        for challenge_id, count in db.session.query(
+            Solve.challenge_id, func.count(Solve.id)
+        ).group_by(Solve.challenge_id)
+    ]
+    if rows:
+        db.session.execute(insert(ChallengeStats), rows)
+    _bump_rebuilt()
+    db.session.commit()
+
+
+def rebuild_score_history() -> None:
+    """
+    Rebuilds the score history by replaying the solve table in order. Solves
+    keep only their current value, so graphs of rescored challenges show each
+    team's score as if those values had applied from the start.
+    """
+    db.session.execute(ScoreHistory.__table__.delete())
+    totals: Dict[int, int] = {}
+    rows = []
+    for team_id, created_at, points in db.session.query(
+        Solve.team_id, Solve.created_at, Solve.points_awarded
+    ).order_by(Solve.created_at, Solve.id):
+        totals[team_id] = totals.get(team_id, 0) + points
+        rows.append({"team_id": team_id, "at": created_at, "score": totals[team_id]})
+    if rows:
+        db.session.execute(insert(ScoreHistory), rows)
+    _bump_rebuilt()
+    db.session.commit()
+
+
+def get_scoreboard(session: Optional[Session] = None):
+    """
+    Generates the scoreboard data from the materialized team standings, read
+    from the replica if there is one unless a `session` is given.
+    Returns a list of dicts:
+    [{'rank': 1, 'team_id': 1, 'team_name': 'Team A', 'score': 500, 'last_solve_at': datetime, 'last_solve_by': 'user1'}, ...]
+    """
+    session = session or read_session()
+    scoreboard_query = (
+        session.query(
+            TeamStanding.team_id,
+            Team.name.label("team_name"),
+            TeamStanding.score,
+            TeamStanding.last_solve_at,
+            TeamStanding.last_solve_by,
+        )
+        .join(Team, Team.id == TeamStanding.team_id)
+        .order_by(
+            desc(TeamStanding.score), TeamStanding.last_solve_at.asc().nulls_last()
+        )
+    )
+
+    scoreboard_data = [row._asdict() for row in scoreboard_query]
     for i, row in enumerate(scoreboard_data):
-        row['rank'] = i + 1
-        
-    return scoreboard_data
\ No newline at end of file
+        row["rank"] = i + 1
+
+    return scoreboard_data
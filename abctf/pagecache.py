@@ -0,0 +1,167 @@
+"""
+Whole-response cache for pages that look the same to everyone who can see them.
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Optional
+
+from flask import Flask, Response, make_response, request, session
+from flask_login import current_user
+
+from .extensions import chall_service
+from .models import Counter, get_counters
+from .sqlitestore import SQLiteStore
+
+
+def data_version() -> str:
+    """
+    Identifies the current state of everything a cached page can show: the
+    solve and team counters (one primary key query) and the loaded challenges.
+    """
+    versions = get_counters(Counter.SOLVES, Counter.TEAMS)
+    return (
+        f"{versions[Counter.SOLVES]}-{versions[Counter.TEAMS]}-{chall_service.version}"
+    )
+
+
+class PageCache:
+    """
+    LRU cache of rendered pages and other team-agnostic data, keyed on the
+    request path (query strings are ignored) and `data_version()`. Entries
+    are never invalidated, they just stop being asked for once a solve, team
+    change or challenge reload moves the version on, and age out of the LRU.
+
+    With a `shared_path`, entries are also kept in a SQLite file that every
+    worker on the host reads through, so a page rendered by one worker is a
+    hit for the rest. It holds one row per key, the last version written.
+    """
+
+    def __init__(self, max_entries: int = 256, shared_path: str = "") -> None:
+        self.max_entries = max_entries
+        self.shared_path = shared_path
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._store: Optional[SQLiteStore] = None
+
+    def init_app(self, app: Flask) -> None:
+        self.enabled = self.max_entries > 0
+        if self.enabled and self.shared_path:
+            self._store = SQLiteStore(
+                self.shared_path,
+                schema=[
+                    "CREATE TABLE IF NOT EXISTS page ("
+                    "key TEXT PRIMARY KEY, version TEXT NOT NULL, body BLOB NOT NULL)"
+                ],
+            )
+            # Pages rendered by a previous deployment may use old templates.
+            self._store.execute("DELETE FROM page")
+
+    def _get(self, key: str, version: str) -> Optional[bytes]:
+        full_key = f"{key}@{version}"
+        with self._lock:
+            body = self._entries.get(full_key)
+            if body is not None:
+                self._entries.move_to_end(full_key)
+                self.hits += 1
+                return body
+
+        if self._store is not None:
+            row = self._store.execute(
+                "SELECT body FROM page WHERE key = ? AND version = ?", (key, version)
+            )
+            if row is not None:
+                self._remember(full_key, row[0])
+                with self._lock:
+                    self.hits += 1
+                return row[0]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _remember(self, full_key: str, body: bytes) -> None:
+        with self._lock:
+            self._entries[full_key] = body
+            self._entries.move_to_end(full_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _set(self, key: str, version: str, body: bytes) -> None:
+        self._remember(f"{key}@{version}", body)
+        if self._store is not None:
+            self._store.execute(
+                "INSERT OR REPLACE INTO page (key, version, body) VALUES (?, ?, ?)",
+                (key, version, body),
+            )
+
+    def memoize(self, key: str, build: Callable[[], Any]) -> Any:
+        """
+        Returns `build()`, cached under `key` for the current data version.
+        The result must be JSON serializable.
+        """
+        if not self.enabled:
+            return build()
+        version = data_version()
+        cached = self._get(key, version)
+        if cached is not None:
+            return json.loads(cached)
+        value = build()
+        self._set(key, version, json.dumps(value).encode())
+        return value
+
+    def cached(self, anonymous_only: bool = True):
+        """
+        View decorator caching successful GET responses. With
+        `anonymous_only`, logged in users always get a freshly rendered page,
+        since the page shows their name and team. Pages with pending flash
+        messages are never cached or served from the cache.
+        """
+
+        def decorator(view):
+            @wraps(view)
+            def wrapped(*args, **kwargs):
+                if (
+                    not self.enabled
+                    or request.method != "GET"
+                    or "_flashes" in session
+                    or (anonymous_only and current_user.is_authenticated)
+                ):
+                    return view(*args, **kwargs)
+
+                key = f"page:{request.path}"
+                version = data_version()
+                cached = self._get(key, version)
+                if cached is not None:
+                    return Response(cached, mimetype="text/html")
+
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200 and not response.is_streamed:
+                    self._set(key, version, response.get_data())
+                return response
+
+            return wrapped
+
+        return decorator
+
+    def metrics_text(self) -> str:
+        """Hit and miss totals for this worker in the Prometheus text format."""
+        pid = os.getpid()
+        lines = []
+        for name, value, help_text in (
+            ("abctf_page_cache_hits_total", self.hits, "Page cache hits."),
+            ("abctf_page_cache_misses_total", self.misses, "Page cache misses."),
+        ):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            lines.append(f'{name}{{worker="{pid}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+page_cache = PageCache()
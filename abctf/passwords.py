@@ -0,0 +1,188 @@
+"""
+Password hashing with configurable cost and bounded verification.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Optional, Tuple
+
+from flask import Flask
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from .sqlitestore import SQLiteStore
+
+
+def _native_thread_pool(workers: int) -> ThreadPoolExecutor:
+    """
+    A pool of real OS threads. Under gevent, `threading` is patched to run
+    greenlets on one thread, so gevent's own pool is needed to hash off the hub.
+    """
+    try:
+        from gevent import monkey
+        from gevent.threadpool import ThreadPoolExecutor as GeventThreadPoolExecutor
+    except ImportError:
+        pass
+    else:
+        if monkey.is_module_patched("threading"):
+            return GeventThreadPoolExecutor(workers)
+    return ThreadPoolExecutor(workers, thread_name_prefix="password")
+
+
+class PasswordCheckBusy(Exception):
+    """Too many password checks are already queued; try again shortly."""
+
+
+_TAKE_SLOT = """
+UPDATE password_slot SET expires = :expires
+WHERE id = (
+    SELECT id FROM password_slot WHERE id < :count AND expires < :now LIMIT 1
+)
+RETURNING id
+"""
+
+
+class HostSlots:
+    """
+    A semaphore shared by every worker process on the host, as `count` leased
+    rows in a SQLite file. A lease left behind by a killed worker expires
+    after `lease` seconds.
+    """
+
+    def __init__(self, path: str, count: int, lease: float = 60.0) -> None:
+        self.count = count
+        self.lease = lease
+        self._store = SQLiteStore(
+            path,
+            schema=[
+                "CREATE TABLE IF NOT EXISTS password_slot ("
+                "id INTEGER PRIMARY KEY, expires REAL NOT NULL)"
+            ],
+        )
+        for slot in range(count):
+            self._store.execute(
+                "INSERT OR IGNORE INTO password_slot (id, expires) VALUES (?, 0)",
+                (slot,),
+            )
+
+    def acquire(self, timeout: float) -> Optional[int]:
+        """Takes a slot, polling for up to `timeout` seconds. Returns its id."""
+        deadline = time.monotonic() + timeout
+        while True:
+            now = time.time()
+            row = self._store.execute(
+                _TAKE_SLOT,
+                {"expires": now + self.lease, "count": self.count, "now": now},
+            )
+            if row is not None:
+                return row[0]
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(0.05)
+
+    def release(self, slot: int) -> None:
+        self._store.execute(
+            "UPDATE password_slot SET expires = 0 WHERE id = ?", (slot,)
+        )
+
+
+class PasswordHasher:
+    """
+    Hashes and verifies passwords with werkzeug.
+
+    :param method: A werkzeug hash method, e.g. `"scrypt:16384:8:1"` or
+        `"pbkdf2:sha256:600000"`. Stored hashes made with any other parameters
+        still verify, and `needs_rehash()` reports them so they can be
+        upgraded (or downgraded) the next time their owner logs in.
+    :param workers: Run checks on a pool of this many threads instead of the
+        calling thread (0 checks inline). hashlib releases the GIL while
+        hashing, so this caps the CPU that logins can take from other requests
+        in the same worker. It only bounds workers that handle several
+        requests at once (gthread, gevent), and in gevent workers it also
+        keeps hashing from blocking every other connection.
+    :param max_concurrent: Checks allowed at once across every worker on the
+        host (0 for no limit), so a burst of logins cannot occupy every sync
+        worker hashing. Requires `init_app()`.
+    :param queue_timeout: Seconds a check may wait for a pool thread or host
+        slot before `PasswordCheckBusy` is raised. A sync worker is held for
+        that long, so keep it short there.
+    """
+
+    def __init__(
+        self,
+        method: str = "scrypt",
+        workers: int = 0,
+        max_concurrent: int = 0,
+        queue_timeout: float = 10.0,
+    ) -> None:
+        self.method = method
+        self.workers = workers
+        self.max_concurrent = max_concurrent
+        self.queue_timeout = queue_timeout
+        self._host_slots: Optional[HostSlots] = None
+        self._prefix: Optional[str] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[threading.BoundedSemaphore] = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app: Flask) -> None:
+        if self.max_concurrent > 0:
+            # Shares the rate limiter's file, which every worker already opens.
+            self._host_slots = HostSlots(
+                app.config.get("RATE_LIMIT_DB", "ratelimit.db"), self.max_concurrent
+            )
+
+    def _get_pool(self) -> Tuple[ThreadPoolExecutor, threading.BoundedSemaphore]:
+        # Created on first use, after a gevent worker has monkey-patched
+        # `threading`, so the semaphore cooperates with other greenlets.
+        with self._lock:
+            if self._pool is None or self._slots is None:
+                self._pool = _native_thread_pool(self.workers)
+                self._slots = threading.BoundedSemaphore(self.workers * 4)
+            return self._pool, self._slots
+
+    @property
+    def prefix(self) -> str:
+        """The parameter prefix (`method:args`) of hashes made with `method`."""
+        if self._prefix is None:
+            self._prefix = generate_password_hash("", self.method).split("$", 1)[0]
+        return self._prefix
+
+    def hash(self, password: str) -> str:
+        return generate_password_hash(password, self.method)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        return password_hash.split("$", 1)[0] != self.prefix
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        """
+        Checks a password once a host slot is free, on the pool if one is
+        configured.
+        """
+        if self._host_slots is None:
+            return self._check(password_hash, password)
+        slot = self._host_slots.acquire(self.queue_timeout)
+        if slot is None:
+            raise PasswordCheckBusy("Too many logins in progress")
+        try:
+            return self._check(password_hash, password)
+        finally:
+            self._host_slots.release(slot)
+
+    def _check(self, password_hash: str, password: str) -> bool:
+        if self.workers <= 0:
+            return check_password_hash(password_hash, password)
+
+        pool, slots = self._get_pool()
+        if not slots.acquire(timeout=self.queue_timeout):
+            raise PasswordCheckBusy("Too many logins in progress")
+        try:
+            future = pool.submit(check_password_hash, password_hash, password)
+            try:
+                return future.result(timeout=self.queue_timeout)
+            except FutureTimeout:
+                future.cancel()
+                raise PasswordCheckBusy("Too many logins in progress")
+        finally:
+            slots.release()
@@ -0,0 +1,169 @@
+"""
+Module containing hooks for measuring what requests cost.
+"""
+
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+from flask import Flask, Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+@contextmanager
+def count_queries() -> Iterator[List[str]]:
+    """
+    Records every SQL statement executed on the app's engine inside the block.
+    Must be used within an app context.
+
+        with count_queries() as statements:
+            client.get("/team/list")
+        assert len(statements) == 3
+    """
+    statements: List[str] = []
+
+    def before_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        statements.append(statement)
+
+    engine = current_app.extensions["sqlalchemy"].engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+class RequestProfile:
+    """What a single request has cost so far."""
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.render_seconds = 0.0
+
+
+class Profiler:
+    """
+    Records, per request, the number of SQL statements, time spent in the
+    database, time spent rendering templates and wall time, and aggregates them
+    per endpoint. Totals are kept per worker process and exposed in the
+    Prometheus text format by `metrics_text()`.
+
+    Enabled by the `PROFILING` config key or debug mode. In debug mode the
+    per-request numbers are also sent back as a `Server-Timing` header.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self._listening = False
+        self._lock = threading.Lock()
+        self._totals: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: defaultdict(float)
+        )
+
+    def init_app(self, app: Flask) -> None:
+        self.enabled = bool(app.config.get("PROFILING")) or app.debug
+        if not self.enabled:
+            return
+
+        if not self._listening:
+            event.listen(Engine, "before_cursor_execute", self._before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", self._after_cursor_execute)
+            self._listening = True
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    @staticmethod
+    def _current() -> RequestProfile | None:
+        if not has_request_context():
+            return None
+        return g.get("_profile")
+
+    def _before_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        conn.info.setdefault("_profile_query_start", []).append(time.perf_counter())
+
+    def _after_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        starts = conn.info.get("_profile_query_start")
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        profile = self._current()
+        if profile is not None:
+            profile.db_queries += 1
+            profile.db_seconds += elapsed
+
+    def record_render(self, seconds: float) -> None:
+        """Adds template rendering time to the current request."""
+        profile = self._current()
+        if profile is not None:
+            profile.render_seconds += seconds
+
+    def _before_request(self) -> None:
+        g._profile = RequestProfile()
+
+    def _after_request(self, response: Response) -> Response:
+        profile = self._current()
+        if profile is None:
+            return response
+        wall_seconds = time.perf_counter() - profile.start
+
+        with self._lock:
+            totals = self._totals[request.endpoint or "unknown"]
+            totals["requests"] += 1
+            totals["wall_seconds"] += wall_seconds
+            totals["db_queries"] += profile.db_queries
+            totals["db_seconds"] += profile.db_seconds
+            totals["render_seconds"] += profile.render_seconds
+
+        if current_app.debug:
+            response.headers["Server-Timing"] = ", ".join(
+                [
+                    f'db;dur={profile.db_seconds * 1000:.2f};desc="{profile.db_queries} queries"',
+                    f"render;dur={profile.render_seconds * 1000:.2f}",
+                    f"total;dur={wall_seconds * 1000:.2f}",
+                ]
+            )
+            response.headers["X-DB-Queries"] = str(profile.db_queries)
+        return response
+
+    def metrics_text(self) -> str:
+        """Per-endpoint totals for this worker in the Prometheus text format."""
+        metrics = [
+            ("requests", "abctf_requests_total", "Requests handled."),
+            (
+                "wall_seconds",
+                "abctf_request_seconds_total",
+                "Wall time spent in requests.",
+            ),
+            ("db_queries", "abctf_db_queries_total", "SQL statements executed."),
+            ("db_seconds", "abctf_db_seconds_total", "Time spent executing SQL."),
+            (
+                "render_seconds",
+                "abctf_render_seconds_total",
+                "Time spent rendering templates.",
+            ),
+        ]
+        pid = os.getpid()
+        with self._lock:
+            snapshot = {endpoint: dict(t) for endpoint, t in self._totals.items()}
+
+        lines = []
+        for key, name, help_text in metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for endpoint, totals in sorted(snapshot.items()):
+                lines.append(
+                    f'{name}{{endpoint="{endpoint}",worker="{pid}"}} {totals[key]:g}'
+                )
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,135 @@
+"""
+Token-bucket rate limiting shared by every worker on the host.
+
+Buckets live in a small SQLite file of their own (not the main database), and
+each check is a single atomic UPSERT that refills the bucket for the elapsed
+time and takes a token if one is available, so limits hold across gunicorn
+workers without a lock server and without touching the main database.
+"""
+
+import math
+import time
+from functools import wraps
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from flask import Flask, Response, request
+from flask_login import current_user
+
+from .sqlitestore import SQLiteStore
+
+Rate = Tuple[int, float]
+"""(capacity, refill per second)"""
+
+
+def parse_rate(spec: str) -> Optional[Rate]:
+    """Parses `"<count>/<seconds>"`, e.g. `"10/60"`. Empty or `"0"` disables."""
+    spec = spec.strip()
+    if not spec or spec == "0":
+        return None
+    count, seconds = spec.split("/")
+    return int(count), int(count) / float(seconds)
+
+
+KEY_FUNCTIONS: Dict[str, Callable[[], Optional[str]]] = {
+    "user": lambda: str(current_user.id) if current_user.is_authenticated else None,
+    "team": lambda: (
+        str(current_user.team_id)
+        if current_user.is_authenticated and current_user.team_id is not None
+        else None
+    ),
+    "ip": lambda: request.remote_addr,
+    # Per address too, so nobody can lock a user out by failing their login.
+    "username": lambda: (
+        f"{username}@{request.remote_addr}"
+        if (username := request.form.get("username"))
+        else None
+    ),
+}
+"""
+How to identify the caller for each kind of bucket. Behind a reverse proxy,
+`remote_addr` is only the client's address with `TRUSTED_PROXIES` set.
+"""
+
+_TAKE_TOKEN = """
+INSERT INTO bucket (key, tokens, updated, allowed) VALUES (:key, :capacity - 1, :now, 1)
+ON CONFLICT (key) DO UPDATE SET
+    allowed = MIN(:capacity, tokens + (:now - updated) * :rate) >= 1,
+    tokens = MIN(:capacity, tokens + (:now - updated) * :rate)
+        - (MIN(:capacity, tokens + (:now - updated) * :rate) >= 1),
+    updated = :now
+RETURNING allowed, tokens
+"""
+
+
+class RateLimiter:
+    """
+    Named groups of token buckets applied to routes with `limit()`. Rules come
+    from the `RATE_LIMITS` config key, e.g.
+
+        {"submit": {"user": (10, 10 / 60), "ip": (30, 30 / 60)}}
+    """
+
+    def __init__(self) -> None:
+        self.rules: Dict[str, Dict[str, Rate]] = {}
+        self._store: Optional[SQLiteStore] = None
+
+    def init_app(self, app: Flask) -> None:
+        self.rules = app.config.get("RATE_LIMITS", {})
+        self._store = SQLiteStore(
+            app.config.get("RATE_LIMIT_DB", "ratelimit.db"),
+            schema=[
+                "CREATE TABLE IF NOT EXISTS bucket ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, "
+                "updated REAL NOT NULL, allowed INTEGER NOT NULL)"
+            ],
+        )
+
+    def take(self, key: str, rate: Rate) -> float:
+        """
+        Takes one token from the bucket `key`.
+
+        :return: 0 if allowed, otherwise the seconds until a token is available.
+        """
+        assert self._store is not None
+        capacity, refill = rate
+        allowed, tokens = self._store.execute(
+            _TAKE_TOKEN,
+            {"key": key, "capacity": capacity, "rate": refill, "now": time.time()},
+        )
+        if allowed:
+            return 0.0
+        return (1 - tokens) / refill
+
+    def check(self, name: str) -> float:
+        """Applies every bucket of the group `name` to the current request."""
+        wait = 0.0
+        for kind, rate in self.rules.get(name, {}).items():
+            identity = KEY_FUNCTIONS[kind]()
+            if identity is None:
+                continue
+            wait = max(wait, self.take(f"{name}:{kind}:{identity}", rate))
+        return wait
+
+    def limit(self, name: str, methods: Iterable[str] = ("POST",)):
+        """
+        Route decorator rejecting requests over the `name` limits with a 429
+        before the view (and so any database work) runs. Place it below
+        `login_required` so the user is known.
+        """
+
+        def decorator(view):
+            @wraps(view)
+            def wrapped(*args, **kwargs):
+                if request.method in methods:
+                    wait = self.check(name)
+                    if wait > 0:
+                        return Response(
+                            "Too many attempts, slow down.",
+                            status=429,
+                            headers={"Retry-After": str(math.ceil(wait))},
+                        )
+                return view(*args, **kwargs)
+
+            return wrapped
+
+        return decorator
@@ -1,13 +1,19 @@
-from typing import Any, Dict
+from functools import cached_property
+from typing import Any, Dict, FrozenSet, Optional
 from flask import (
+    g,
     render_template as _render_template,
     render_template_string as _render_template_string,
 )
 from jinja2 import Template
 from datetime import datetime
 import subprocess
+import time
 from flask_login import current_user
 
+from .extensions import db, profiler
+from .models import Solve, Team
+
 
 def get_current_commit_hash() -> str:
     """Gets the current git commit hash."""
@@ -31,13 +37,55 @@ Global constants passed to all templates.
 """
 
 
+class UserContext:
+    """
+    The current user's identity and team, resolved once per request. Anything
+    that needs a query is only loaded on first access and then reused, so
+    templates can look it up per row without issuing SQL.
+    """
+
+    def __init__(self) -> None:
+        self.is_authed = current_user.is_authenticated
+        self.id: Optional[int] = current_user.id if self.is_authed else None
+        self.username: str = current_user.username if self.is_authed else ""
+        self.is_admin: bool = self.is_authed and current_user.is_admin
+        self.team_id: Optional[int] = current_user.team_id if self.is_authed else None
+        self.is_on_team = self.team_id is not None
+
+    @cached_property
+    def team_name(self) -> Optional[str]:
+        if self.team_id is None:
+            return None
+        return db.session.query(Team.name).filter_by(id=self.team_id).scalar()
+
+    @cached_property
+    def solved_challenge_ids(self) -> FrozenSet[str]:
+        if self.team_id is None:
+            return frozenset()
+        return frozenset(
+            challenge_id
+            for (challenge_id,) in db.session.query(Solve.challenge_id).filter_by(
+                team_id=self.team_id
+            )
+        )
+
+
+def get_user_context() -> UserContext:
+    """Returns the current request's `UserContext`, creating it on first use."""
+    if "user_context" not in g:
+        g.user_context = UserContext()
+    return g.user_context
+
+
 def make_context(context: Dict[str, Any]):
+    user = get_user_context()
     user_context = {
-        "is_authed": current_user.is_authenticated,
-        "is_on_team": current_user.is_authenticated
-        and current_user.team_id is not None,
-        "is_admin": current_user.is_authenticated and current_user.is_admin,
-        "username": current_user.username if current_user.is_authenticated else "",
+        "is_authed": user.is_authed,
+        "is_on_team": user.is_on_team,
+        "is_admin": user.is_admin,
+        "username": user.username,
+        "team_id": user.team_id,
+        "user": user,
         "current_user": current_user,
     }
     """
@@ -58,7 +106,10 @@ def render_template(
     :param context: The variables to make available in the template.
     """
 
-    return _render_template(template_name_or_list, **make_context(context))
+    start = time.perf_counter()
+    rendered = _render_template(template_name_or_list, **make_context(context))
+    profiler.record_render(time.perf_counter() - start)
+    return rendered
 
 
 def render_template_string(source: str, **context: Any):
@@ -66,4 +117,7 @@ def render_template_string(source: str, **context: Any):
     Render a template by name with the given context.
     """
 
-    return _render_template_string(source, **make_context(context))
+    start = time.perf_counter()
+    rendered = _render_template_string(source, **make_context(context))
+    profiler.record_render(time.perf_counter() - start)
+    return rendered
@@ -2,9 +2,11 @@ from .main import bp as main_bp
 from .auth import bp as auth_bp
 from .team import bp as team_bp
 from .chall import bp as chall_bp
+from .api import bp as api_bp
+from .admin import bp as admin_bp
 
 from typing import List
 
 from flask import Blueprint
 
-all_bp: List[Blueprint] = [main_bp, auth_bp, team_bp, chall_bp]
+all_bp: List[Blueprint] = [main_bp, auth_bp, team_bp, chall_bp, api_bp, admin_bp]
@@ -0,0 +1,73 @@
+from functools import wraps
+
+from flask import Blueprint, abort, request
+from flask_login import current_user, login_required
+from sqlalchemy.orm import joinedload
+
+from ..models import Submission, Team, User
+from ..render import render_template
+from ..submissions import submission_log
+
+bp = Blueprint("admin", __name__, url_prefix="/admin")
+
+SUBMISSIONS_PER_PAGE = 100
+
+
+def admin_required(view):
+    @wraps(view)
+    @login_required
+    def wrapped(*args, **kwargs):
+        if not current_user.is_admin:
+            abort(403)
+        return view(*args, **kwargs)
+
+    return wrapped
+
+
+@bp.route("/submissions")
+@admin_required
+def submissions():
+    """
+    The submission log, newest first, optionally filtered by challenge, team,
+    user and correctness. Pages are keyed on the last id shown (`before`) so
+    deep pages cost the same as the first one.
+    """
+    filters = {
+        "challenge": request.args.get("challenge", "").strip(),
+        "team": request.args.get("team", type=int),
+        "user": request.args.get("user", type=int),
+        "correct": request.args.get("correct", ""),
+    }
+
+    query = Submission.query.options(
+        joinedload(Submission.user).load_only(User.username),
+        joinedload(Submission.team).load_only(Team.name),
+    )
+    if filters["challenge"]:
+        query = query.filter(Submission.challenge_id == filters["challenge"])
+    if filters["team"] is not None:
+        query = query.filter(Submission.team_id == filters["team"])
+    if filters["user"] is not None:
+        query = query.filter(Submission.user_id == filters["user"])
+    if filters["correct"] in ("0", "1"):
+        query = query.filter(Submission.correct == (filters["correct"] == "1"))
+    before = request.args.get("before", type=int)
+    if before is not None:
+        query = query.filter(Submission.id < before)
+
+    rows = query.order_by(Submission.id.desc()).limit(SUBMISSIONS_PER_PAGE + 1).all()
+    next_before = None
+    if len(rows) > SUBMISSIONS_PER_PAGE:
+        rows = rows[:SUBMISSIONS_PER_PAGE]
+        next_before = rows[-1].id
+
+    return render_template(
+        "admin_submissions.html",
+        submissions=rows,
+        filters={
+            key: value for key, value in filters.items() if value not in (None, "")
+        },
+        next_before=next_before,
+        pending=submission_log.pending,
+        dropped=submission_log.dropped,
+    )
@@ -0,0 +1,166 @@
+from typing import Optional
+
+from flask import Blueprint, Response, abort, jsonify, request
+from flask_login import login_required
+from sqlalchemy.orm import joinedload, load_only, selectinload
+
+from ..extensions import chall_service, db
+from ..history import score_history
+from ..models import (
+    Counter,
+    Solve,
+    Team,
+    User,
+    get_counters,
+    get_scoreboard,
+    get_solve_counts,
+)
+
+bp = Blueprint("api", __name__, url_prefix="/api")
+
+# Read-only JSON views of the scoreboard, challenges and teams. Every response
+# carries a strong ETag built from version counters that are bumped in the
+# same transaction as the data they cover, so a conditional GET is answered
+# with a single primary-key lookup and no recomputation.
+
+
+def not_modified(etag: str) -> Optional[Response]:
+    """Returns a 304 response if the client already holds `etag`."""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+        return response
+    return None
+
+
+def with_etag(response: Response, etag: str) -> Response:
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+
+@bp.route("/scoreboard")
+def scoreboard():
+    """The scoreboard, in a CTFtime-compatible `standings` format."""
+    versions = get_counters(Counter.SOLVES, Counter.TEAMS)
+    etag = f"scoreboard-{versions[Counter.SOLVES]}-{versions[Counter.TEAMS]}"
+    if cached := not_modified(etag):
+        return cached
+
+    standings = [
+        {
+            "pos": row["rank"],
+            "team": row["team_name"],
+            "team_id": row["team_id"],
+            "score": row["score"],
+            "last_solve_at": row["last_solve_at"].isoformat()
+            if row["last_solve_at"]
+            else None,
+        }
+        for row in get_scoreboard()
+    ]
+    return with_etag(jsonify({"standings": standings}), etag)
+
+
+@bp.route("/scoreboard/history")
+def scoreboard_history():
+    """
+    Score over time of the top teams, for graphs. `top` (default 10, max 50)
+    picks how many teams and `points` (default 100, max 500) caps the number
+    of samples per team. Times are Unix timestamps, from the first to the last
+    score change, so a response only changes when the scores do.
+    """
+    top = min(max(request.args.get("top", 10, type=int), 1), 50)
+    points = min(max(request.args.get("points", 100, type=int), 2), 500)
+    versions = get_counters(Counter.SOLVES, Counter.TEAMS)
+    etag = (
+        f"history-{versions[Counter.SOLVES]}-{versions[Counter.TEAMS]}"
+        f"-{top}-{points}"
+    )
+    if cached := not_modified(etag):
+        return cached
+
+    score_history.refresh(versions[Counter.SOLVES])
+    teams = get_scoreboard()[:top]
+    start, end = score_history.span()
+    samples = score_history.sample(
+        [row["team_id"] for row in teams], start, end, points
+    )
+    series = [
+        {
+            "team_id": row["team_id"],
+            "team": row["team_name"],
+            "points": [[round(at), score] for at, score in samples[row["team_id"]]],
+        }
+        for row in teams
+    ]
+    return with_etag(jsonify({"start": start, "end": end, "series": series}), etag)
+
+
+@bp.route("/challenges")
+@login_required
+def challenges():
+    """Every challenge with its current, live value and solve count."""
+    versions = get_counters(Counter.SOLVES)
+    etag = f"challenges-{versions[Counter.SOLVES]}-{chall_service.version}"
+    if cached := not_modified(etag):
+        return cached
+
+    solve_counts = get_solve_counts()
+    data = []
+    for chal in chall_service.get_all_challenges():
+        num_solves = solve_counts.get(chal.id, 0)
+        data.append(
+            {
+                "id": chal.id,
+                "title": chal.title,
+                "category": chal.category,
+                "value": chal.value(num_solves),
+                "solves": num_solves,
+            }
+        )
+    return with_etag(jsonify({"challenges": data}), etag)
+
+
+@bp.route("/teams/<int:team_id>")
+@login_required
+def team(team_id):
+    """A team's members, score and solves."""
+    versions = get_counters(Counter.SOLVES, Counter.TEAMS)
+    etag = f"team-{team_id}-{versions[Counter.SOLVES]}-{versions[Counter.TEAMS]}"
+    if cached := not_modified(etag):
+        return cached
+
+    team = db.session.get(
+        Team,
+        team_id,
+        options=[
+            joinedload(Team.captain).load_only(User.username),
+            selectinload(Team.users).load_only(User.id, User.username),
+            selectinload(Team.solves)
+            .load_only(Solve.challenge_id, Solve.points_awarded, Solve.created_at)
+            .joinedload(Solve.user)
+            .load_only(User.username),
+        ],
+    )
+    if team is None:
+        abort(404)
+
+    data = {
+        "id": team.id,
+        "name": team.name,
+        "captain": team.captain.username if team.captain else None,
+        "members": [user.username for user in team.users],
+        "score": sum(solve.points_awarded for solve in team.solves),
+        "solves": [
+            {
+                "challenge_id": solve.challenge_id,
+                "points": solve.points_awarded,
+                "created_at": solve.created_at.isoformat(),
+                "solved_by": solve.user.username,
+            }
+            for solve in sorted(team.solves, key=lambda solve: solve.created_at)
+        ],
+    }
+    return with_etag(jsonify(data), etag)
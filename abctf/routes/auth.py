@@ -1,6 +1,7 @@
-from ..models import User
+from ..models import User, invalidate_identity
+from ..passwords import PasswordCheckBusy
 from ..render import render_template
-from ..extensions import db
+from ..extensions import db, limiter
 
 from flask import Blueprint
 from flask import request, redirect, url_for, flash
@@ -17,14 +18,22 @@ bp = Blueprint("auth", __name__)
 
 
 @bp.route("/login", methods=["GET", "POST"])
+@limiter.limit("login")
 def login():
     if current_user.is_authenticated:
         return redirect(url_for("main.index"))
     if request.method == "POST":
         user = User.query.filter_by(username=request.form["username"]).first()
-        if user is None or not user.check_password(request.form["password"]):
+        try:
+            valid = user is not None and user.check_password(request.form["password"])
+        except PasswordCheckBusy:
+            flash("The server is busy logging other players in, please try again.")
+            return render_template("_auth.html", action="Login"), 503
+        if not valid:
             flash("Invalid username or password")
             return redirect(url_for("auth.login"))
+        db.session.commit()  # Saves the password hash if it was upgraded.
+        invalidate_identity()
         login_user(user)
         return redirect(url_for("main.index"))
     return render_template("_auth.html", action="Login")
@@ -54,4 +63,5 @@ def register():
 @login_required
 def logout():
     logout_user()
+    invalidate_identity()
     return redirect(url_for("main.index"))
@@ -1,47 +1,69 @@
-from flask import Blueprint, request, redirect, url_for, flash, abort
+import os
+import unicodedata
+from urllib.parse import quote
+
+from flask import (
+    Blueprint,
+    Response,
+    abort,
+    current_app,
+    flash,
+    redirect,
+    request,
+    send_file,
+    url_for,
+)
 from flask_login import login_required, current_user
-from sqlalchemy import func
+from sqlalchemy.orm import joinedload
 
-from ..render import render_template
-from ..models import Solve, Team, User, get_scoreboard
-from ..extensions import chall_service, db
+from ..render import get_user_context, render_template
+from ..models import Solve, User, award_solve, get_solve_count, get_solve_counts
+from ..extensions import chall_service, db, limiter, solve_sandbox
+from ..live import live_feed
+from ..pagecache import page_cache
+from ..sandbox import SandboxError
+from ..submissions import submission_log
 
 bp = Blueprint("challenges", __name__, url_prefix="/challenges")
 
 
-@bp.route("/")
-@login_required
-def board():
-    """Displays all challenges with their CURRENT, LIVE point values."""
-    all_challenges = chall_service.get_all_challenges()
-
-    solve_counts_query = db.session.query(
-        Solve.challenge_id,
-        func.count(Solve.challenge_id)
-    ).group_by(Solve.challenge_id).all()
-
-    solve_counts = dict(solve_counts_query)
-
-    solved_challenge_ids = set()
-    if current_user.team:
-        solved_challenge_ids = {s.challenge_id for s in current_user.team.solves}
+def build_board():
+    """The team-agnostic part of the board: challenges and values by category."""
+    solve_counts = get_solve_counts()
 
     challenges_by_category = {}
-    for chal in all_challenges:
+    for chal in chall_service.get_all_challenges():
         num_solves = solve_counts.get(chal.id, 0)
-        
+
         current_value = chal.value(num_solves)
 
         challenge_data = {
             "id": chal.id,
             "title": chal.title,
             "points": current_value,
-            "solved_by_user": chal.id in solved_challenge_ids
         }
 
         if chal.category not in challenges_by_category:
             challenges_by_category[chal.category] = []
         challenges_by_category[chal.category].append(challenge_data)
+    return challenges_by_category
+
+
+@bp.route("/")
+@login_required
+def board():
+    """Displays all challenges with their CURRENT, LIVE point values."""
+    solved_challenge_ids = get_user_context().solved_challenge_ids
+
+    challenges_by_category = {
+        category: [
+            {**chal, "solved_by_user": chal["id"] in solved_challenge_ids}
+            for chal in challenges
+        ]
+        for category, challenges in page_cache.memoize(
+            "challenge-board", build_board
+        ).items()
+    }
 
     return render_template(
         "challenges.html",
@@ -56,15 +78,17 @@ def detail(challenge_id):
     if not challenge:
         abort(404)
 
-    num_solves = Solve.query.filter_by(challenge_id=challenge.id).count()
+    num_solves = get_solve_count(challenge.id)
 
     current_value = challenge.value(num_solves)
 
     team_solve = None
-    if current_user.team:
-        team_solve = Solve.query.filter_by(
-            team_id=current_user.team_id, challenge_id=challenge.id
-        ).first()
+    if current_user.team_id is not None:
+        team_solve = (
+            Solve.query.options(joinedload(Solve.user))
+            .filter_by(team_id=current_user.team_id, challenge_id=challenge.id)
+            .first()
+        )
 
     return render_template(
         "challenge.html",
@@ -75,44 +99,142 @@ def detail(challenge_id):
     )
 
 
+ATTACHMENT_MAX_AGE = 365 * 24 * 3600
+
+
+def _set_attachment_name(response: Response, name: str) -> None:
+    """
+    Sets `Content-Disposition` like `send_file` does: quoted, with an ASCII
+    fallback and an RFC 5987 `filename*` for non-ASCII names.
+    """
+    try:
+        name.encode("ascii")
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize("NFKD", name)
+        options = {
+            "filename": simple.encode("ascii", "ignore").decode("ascii"),
+            "filename*": f"UTF-8''{quote(name, safe='!#$&+^`|~')}",
+        }
+    else:
+        options = {"filename": name}
+    response.headers.set("Content-Disposition", "attachment", **options)
+
+
+@bp.route("/<string:challenge_id>/files/<string:digest>/<string:name>")
+@login_required
+def attachment(challenge_id, digest, name):
+    """
+    Serves a challenge attachment. The URL contains the file's content hash,
+    so browsers and proxies may keep it forever; links to an older version
+    redirect to the current one.
+    """
+    challenge = chall_service.get_challenge(challenge_id)
+    file = challenge.attachments.get(name) if challenge else None
+    if file is None:
+        abort(404)
+    if digest != file.digest:
+        return redirect(
+            url_for(
+                "challenges.attachment",
+                challenge_id=challenge.id,
+                digest=file.digest,
+                name=file.name,
+            )
+        )
+
+    accel_prefix = current_app.config["ATTACHMENT_ACCEL_PREFIX"]
+    if accel_prefix:
+        # nginx serves the file itself, ranges included, from an internal
+        # location mapped onto the challenge directory.
+        location = os.path.relpath(
+            file.path, os.path.realpath(chall_service.challenges_dir)
+        )
+        response = Response(mimetype="application/octet-stream")
+        response.headers["X-Accel-Redirect"] = (
+            f"{accel_prefix.rstrip('/')}/{quote(location)}"
+        )
+        _set_attachment_name(response, file.name)
+        response.set_etag(file.digest)
+        response = response.make_conditional(request)
+    else:
+        # Range and If-None-Match are handled here. Whole files go out through
+        # the server's wsgi.file_wrapper (sendfile(2) under gunicorn), or as an
+        # X-Sendfile header with USE_X_SENDFILE.
+        response = send_file(
+            file.path,
+            as_attachment=True,
+            download_name=file.name,
+            etag=file.digest,
+            max_age=ATTACHMENT_MAX_AGE,
+            conditional=True,
+        )
+    # Only logged in users may download, so shared caches must not keep it.
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.max_age = ATTACHMENT_MAX_AGE
+    response.cache_control.immutable = True
+    return response
+
+
 @bp.route("/<string:challenge_id>/submit", methods=["POST"])
 @login_required
+@limiter.limit("submit")
 def submit(challenge_id):
     """Handles the flag submission logic."""
     challenge = chall_service.get_challenge(challenge_id)
     if not challenge:
         abort(404)
 
-    if not current_user.team:
+    if current_user.team_id is None:
         flash("You must be on a team to submit flags.", "warning")
         return redirect(url_for("challenges.detail", challenge_id=challenge.id))
 
-    if Solve.query.filter_by(
-        team_id=current_user.team_id, challenge_id=challenge.id
-    ).first():
-        flash("Your team has already solved this challenge.", "info")
-        return redirect(url_for("challenges.detail", challenge_id=challenge.id))
-
     submitted_flag = request.form.get("flag", "").strip()
     if not submitted_flag:
         flash("You must provide a flag.", "warning")
         return redirect(url_for("challenges.detail", challenge_id=challenge.id))
 
-    if challenge.solve(submitted_flag):
-        num_prior_solves = Solve.query.filter_by(challenge_id=challenge.id).count()
-        points = challenge.value(num_prior_solves)
+    checker_error = None
+    try:
+        correct = solve_sandbox.check(challenge, submitted_flag)
+    except SandboxError as e:
+        checker_error = e
+        correct = False
+
+    submission_log.record(
+        challenge.id,
+        current_user.id,
+        current_user.team_id,
+        submitted_flag,
+        correct,
+        request.remote_addr,
+    )
+    if checker_error is not None:
+        flash(f"{checker_error}. Please try again in a moment.", "warning")
+        return redirect(url_for("challenges.detail", challenge_id=challenge.id))
+    if not correct:
+        flash("Incorrect flag. Try again!", "danger")
+        return redirect(url_for("challenges.detail", challenge_id=challenge.id))
 
-        new_solve = Solve(
-            challenge_id=challenge.id,
-            user_id=current_user.id,
-            team_id=current_user.team_id,
-            points_awarded=points,
-        )
-        db.session.add(new_solve)
-        db.session.commit()
+    # The identity may come from the session cache, so re-read the team
+    # before awarding points in case the user was removed from it meanwhile.
+    team_id = db.session.query(User.team_id).filter_by(id=current_user.id).scalar()
+    if team_id is None:
+        flash("You must be on a team to submit flags.", "warning")
+        return redirect(url_for("challenges.detail", challenge_id=challenge.id))
 
-        flash(f"Correct! Your team earned {points} points.", "success")
+    points = award_solve(
+        challenge.id,
+        current_user.id,
+        team_id,
+        current_user.username,
+        challenge.value,
+        rescore=challenge.rescore_solves,
+    )
+    if points is None:
+        flash("Your team has already solved this challenge.", "info")
     else:
-        flash("Incorrect flag. Try again!", "danger")
+        live_feed.notify()
+        flash(f"Correct! Your team earned {points} points.", "success")
 
     return redirect(url_for("challenges.detail", challenge_id=challenge.id))
@@ -1,12 +1,19 @@
+import hmac
+
+from flask import Blueprint, Response, abort, current_app, request
+from flask_login import current_user
+
+from ..extensions import profiler
+from ..live import live_feed
 from ..models import get_scoreboard
+from ..pagecache import page_cache
 from ..render import render_template
 
-from flask import Blueprint, current_app
-
 bp = Blueprint("main", __name__)
 
 
 @bp.route("/")
+@page_cache.cached()
 def index():
     return render_template("index.html")
 
@@ -19,8 +26,50 @@ def debug():
         return "Not in debug mode", 404
 
 
+@bp.route("/metrics")
+def metrics():
+    """
+    Per-endpoint request, SQL and render totals for this worker. Open to
+    admins, or to scrapers presenting `METRICS_TOKEN` as a bearer token.
+    """
+    token = current_app.config["METRICS_TOKEN"]
+    scraper = bool(token) and hmac.compare_digest(
+        request.headers.get("Authorization", ""), f"Bearer {token}"
+    )
+    if not scraper and not (current_user.is_authenticated and current_user.is_admin):
+        abort(403)
+    if not profiler.enabled:
+        return "Profiling is disabled", 404
+    return Response(
+        profiler.metrics_text() + page_cache.metrics_text(),
+        mimetype="text/plain; version=0.0.4",
+    )
+
+
 @bp.route("/scoreboard")
+@page_cache.cached()
 def scoreboard():
     """Displays the main scoreboard."""
     board_data = get_scoreboard()  # Use the utility function
-    return render_template("scoreboard.html", scoreboard=board_data)
+    return render_template(
+        "scoreboard.html",
+        scoreboard=board_data,
+        live=current_app.config["LIVE_SCOREBOARD"],
+        refresh=current_app.config["SCOREBOARD_REFRESH"],
+    )
+
+
+@bp.route("/scoreboard/stream")
+def scoreboard_stream():
+    """
+    Server-Sent Events stream of scoreboard changes and solves. Without
+    `LIVE_SCOREBOARD` it answers 204, which tells browsers not to reconnect,
+    so pages left open from before cannot hold sync workers.
+    """
+    if not current_app.config["LIVE_SCOREBOARD"]:
+        return Response(status=204)
+    return Response(
+        live_feed.stream(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,10 +1,45 @@
+from typing import Optional
+
 from flask import Blueprint, request, redirect, url_for, flash
 from flask_login import login_required, current_user
-from ..models import db, User, Team
+from sqlalchemy import update
+from sqlalchemy.orm import joinedload, load_only, selectinload
+from ..models import (
+    db,
+    User,
+    Team,
+    TeamStanding,
+    Counter,
+    bump_counter,
+    invalidate_identity,
+)
 from ..render import render_template
 
 bp = Blueprint("team", __name__, url_prefix="/team")
 
+TEAMS_PER_PAGE = 50
+
+
+def _current_team_id() -> Optional[int]:
+    """
+    The logged in user's team, read from the database. `current_user` may be
+    a session snapshot taken before another session changed teams.
+    """
+    return db.session.query(User.team_id).filter_by(id=current_user.id).scalar()
+
+
+def _join(team_id: int) -> bool:
+    """
+    Puts the logged in user on `team_id` unless they are already on a team,
+    as one conditional update so concurrent requests cannot both succeed.
+    """
+    result = db.session.execute(
+        update(User)
+        .where(User.id == current_user.id, User.team_id.is_(None))
+        .values(team_id=team_id)
+    )
+    return result.rowcount == 1
+
 
 @bp.route("/")
 @login_required
@@ -14,7 +49,7 @@ def my_team():
     If the user is not on a team, it redirects them to the list of all teams.
     """
     if current_user.team_id:
-        return redirect(url_for("team.view_team", team_id=current_user.team.id))
+        return redirect(url_for("team.view_team", team_id=current_user.team_id))
     else:
         flash("You are not currently on a team.")
         return redirect(url_for("team.list_teams"))
@@ -27,9 +62,11 @@ def create_team():
     Allows a logged-in user who is not already on a team to create one.
     The creator automatically becomes the first member and the captain.
     """
-    if current_user.team:
+    team_id = _current_team_id()
+    if team_id is not None:
+        invalidate_identity()
         flash("You are already on a team and cannot create a new one.")
-        return redirect(url_for("team.view_team", team_id=current_user.team.id))
+        return redirect(url_for("team.view_team", team_id=team_id))
 
     if request.method == "POST":
         team_name = request.form.get("team_name")
@@ -47,10 +84,17 @@ def create_team():
         db.session.add(new_team)
         db.session.flush()
 
-        current_user.team_id = new_team.id
+        if not _join(new_team.id):
+            db.session.rollback()
+            invalidate_identity()
+            flash("You are already on a team and cannot create a new one.")
+            return redirect(url_for("team.my_team"))
         new_team.captain_id = current_user.id
+        db.session.add(TeamStanding(team_id=new_team.id))
+        bump_counter(Counter.TEAMS)
 
         db.session.commit()
+        invalidate_identity()
         flash(f"Team '{new_team.name}' created successfully!")
         return redirect(url_for("team.view_team", team_id=new_team.id))
 
@@ -61,8 +105,9 @@ def create_team():
 @login_required
 def view_team(team_id):
     """Displays the team's details."""
-    team = Team.query.get_or_404(team_id)
-    available_users = User.query.filter_by(team_id=None).all()
+    team = Team.query.options(
+        selectinload(Team.users).load_only(User.id, User.username)
+    ).get_or_404(team_id)
     invite_url = url_for(
         "team.join_by_invite", invite_code=team.invite_code, _external=True
     )
@@ -70,7 +115,6 @@ def view_team(team_id):
     return render_template(
         "team_details.html",
         team=team,
-        available_users=available_users,
         invite_url=invite_url,
     )
 
@@ -78,9 +122,16 @@ def view_team(team_id):
 @bp.route("/list")
 @login_required
 def list_teams():
-    """Displays a list of all existing teams."""
-    all_teams = Team.query.all()
-    return render_template("list_teams.html", teams=all_teams)
+    """Displays a paginated list of all existing teams."""
+    teams = (
+        Team.query.options(
+            load_only(Team.id, Team.name),
+            joinedload(Team.captain).load_only(User.id, User.username),
+        )
+        .order_by(Team.name)
+        .paginate(per_page=TEAMS_PER_PAGE, max_per_page=TEAMS_PER_PAGE)
+    )
+    return render_template("list_teams.html", teams=teams)
 
 
 @bp.route("/join/<string:invite_code>", methods=["GET", "POST"])
@@ -90,12 +141,15 @@ def join_by_invite(invite_code):
     team = Team.query.filter_by(invite_code=invite_code).first_or_404()
 
     if request.method == "POST":
-        if current_user.team:
+        if not _join(team.id):
+            db.session.rollback()
+            invalidate_identity()
             flash("You must leave your current team before joining a new one.")
-            return redirect(url_for("team.view_team", team_id=current_user.team.id))
+            return redirect(url_for("team.my_team"))
 
-        current_user.team_id = team.id
+        bump_counter(Counter.TEAMS)
         db.session.commit()
+        invalidate_identity()
 
         flash(f"Welcome! You have successfully joined team '{team.name}'.")
         return redirect(url_for("team.view_team", team_id=team.id))
@@ -122,6 +176,7 @@ def remove_member(team_id, user_id):
         return redirect(url_for("team.view_team", team_id=team.id))
 
     user_to_remove.team_id = None
+    bump_counter(Counter.TEAMS)
     db.session.commit()
     flash(f"{user_to_remove.username} has been removed from the team.")
     return redirect(url_for("team.view_team", team_id=team.id))
@@ -142,6 +197,7 @@ def set_captain(team_id, user_id):
         return redirect(url_for("team.view_team", team_id=team.id))
 
     team.captain_id = new_captain.id
+    bump_counter(Counter.TEAMS)
     db.session.commit()
     flash(f"{new_captain.username} is now the captain.")
     return redirect(url_for("team.view_team", team_id=team.id))
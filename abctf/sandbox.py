@@ -0,0 +1,199 @@
+"""
+Out-of-process execution of challenge flag checkers.
+
+Challenges that set `"sandbox": true` in their `chall.json` have `solve()` run
+in a small pool of separate processes instead of the web worker, with a
+timeout and an address-space limit, so a slow or runaway checker cannot tie up
+or take down the worker serving the request.
+"""
+
+import atexit
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from .chall import BaseChall, import_challenge
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore[assignment]
+
+
+class SandboxError(Exception):
+    """The checker could not give an answer (timed out, crashed or pool full)."""
+
+
+_instances: Dict[Tuple[str, str, int], BaseChall] = {}
+"""Challenges imported inside a sandbox process, keyed by dir, metadata and mtime."""
+
+
+def _address_space() -> int:
+    """Bytes of address space this process already uses (0 if unknown)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def _limit_resources(memory_bytes: int) -> None:
+    # The checker process has imported the whole `abctf` package (and with it
+    # Flask and SQLAlchemy) by now, so the budget is added on top of that.
+    if resource is not None and memory_bytes > 0:
+        limit = _address_space() + memory_bytes
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _run_solve(
+    metadata: Dict[str, Any], challenge_dir: str, version: int, submitted_flag: str
+) -> bool:
+    key = (challenge_dir, repr(sorted(metadata.items())), version)
+    challenge = _instances.get(key)
+    if challenge is None:
+        challenge = import_challenge(metadata, challenge_dir)
+        _instances[key] = challenge
+    return bool(challenge.solve(submitted_flag))
+
+
+def _serve(conn, memory_bytes: int) -> None:
+    """Main loop of a checker process: answers `solve()` requests until EOF."""
+    _limit_resources(memory_bytes)
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        try:
+            conn.send((True, _run_solve(*request)))
+        except BaseException as e:
+            conn.send((False, repr(e)))
+
+
+class _Checker:
+    """A checker process and our end of the pipe to it."""
+
+    def __init__(self, context, memory_bytes: int) -> None:
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_serve, args=(child_conn, memory_bytes), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class SolveSandbox:
+    """
+    Bounded set of checker processes for sandboxed `solve()` calls.
+
+    Each check borrows an idle process, sends it the flag over a pipe and
+    waits for the answer with `Connection.poll()`, which is built on
+    `selectors` and so also yields to other greenlets in gevent workers.
+
+    :param workers: Number of checker processes.
+    :param timeout: Seconds a single check may take, including time spent
+        waiting for a free process. A check that overruns gets its process
+        killed and replaced, since a stuck process cannot be interrupted.
+    :param memory_mb: Address space each checker process may allocate beyond
+        what it uses once started (Unix only).
+    """
+
+    def __init__(self, workers: int = 2, timeout: float = 5.0, memory_mb: int = 256):
+        self.workers = workers
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self._context: Optional[Any] = None
+        self._idle: Optional["queue.Queue[_Checker]"] = None
+        self._started = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self, deadline: float) -> _Checker:
+        with self._lock:
+            if self._context is None:
+                methods = multiprocessing.get_all_start_methods()
+                self._context = multiprocessing.get_context(
+                    "forkserver" if "forkserver" in methods else "spawn"
+                )
+                self._idle = queue.Queue()
+                atexit.register(self.close)
+            assert self._idle is not None
+            spawn = self._idle.empty() and self._started < self.workers
+            if spawn:
+                self._started += 1
+        if spawn:
+            try:
+                return _Checker(self._context, self.memory_mb * 1024 * 1024)
+            except Exception:
+                self._discard(None)
+                raise
+        try:
+            return self._idle.get(timeout=max(deadline - time.monotonic(), 0))
+        except queue.Empty:
+            raise SandboxError("All flag checkers are busy")
+
+    def _discard(self, checker: Optional[_Checker]) -> None:
+        if checker is not None:
+            checker.kill()
+        with self._lock:
+            self._started -= 1
+
+    def close(self) -> None:
+        """Kills every idle checker process."""
+        if self._idle is None:
+            return
+        while True:
+            try:
+                checker = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(checker)
+
+    def check(self, challenge: BaseChall, submitted_flag: str) -> bool:
+        """
+        Checks a flag, in a checker process if the challenge asks for it and
+        inline otherwise. Raises `SandboxError` if a sandboxed check gives no
+        answer.
+        """
+        if challenge.sandboxed:
+            return self.solve(challenge, submitted_flag)
+        return challenge.solve(submitted_flag)
+
+    def solve(self, challenge: BaseChall, submitted_flag: str) -> bool:
+        """Runs `challenge.solve(submitted_flag)` in a checker process."""
+        deadline = time.monotonic() + self.timeout
+        metadata = challenge._metadata
+        challenge_dir = challenge._challenge_dir
+        try:
+            version = os.stat(f"{challenge_dir}/chall.py").st_mtime_ns
+        except FileNotFoundError:
+            version = 0
+
+        checker = self._acquire(deadline)
+        try:
+            checker.conn.send((metadata, challenge_dir, version, submitted_flag))
+            if not checker.conn.poll(max(deadline - time.monotonic(), 0)):
+                print(
+                    f"  [!] Flag checker for {challenge.id} timed out, restarting it"
+                )
+                self._discard(checker)
+                raise SandboxError("The flag checker timed out")
+            ok, result = checker.conn.recv()
+        except (EOFError, OSError) as e:
+            print(f"  [!] Flag checker for {challenge.id} died: {e!r}")
+            self._discard(checker)
+            raise SandboxError("The flag checker failed") from e
+
+        assert self._idle is not None
+        self._idle.put(checker)
+        if not ok:
+            print(f"  [!] Flag checker for {challenge.id} failed: {result}")
+            raise SandboxError("The flag checker failed")
+        return result
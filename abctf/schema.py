@@ -0,0 +1,126 @@
+"""
+Lightweight, additive schema migrations run at startup.
+
+`db.create_all()` only runs on a fresh database, so tables and indexes added to
+the models later would never reach an existing deployment. `upgrade_schema()`
+creates whatever is missing (never altering or dropping anything) and builds
+derived tables from the solve table the first time they appear.
+"""
+
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import delete, func, inspect, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from .extensions import db
+from .models import (
+    ChallengeStats,
+    ScoreHistory,
+    Solve,
+    TeamStanding,
+    rebuild_challenge_stats,
+    rebuild_score_history,
+    rebuild_standings,
+)
+
+DERIVED_TABLES: List[Tuple[str, Callable[[], None]]] = [
+    (TeamStanding.__tablename__, rebuild_standings),
+    (ChallengeStats.__tablename__, rebuild_challenge_stats),
+    (ScoreHistory.__tablename__, rebuild_score_history),
+]
+"""Tables computed from other tables, with the function that backfills them."""
+
+
+def remove_duplicate_solves() -> int:
+    """
+    Deletes every solve but the first of each (team, challenge), left behind by
+    versions that could award a team twice. Each affected pair is logged with
+    the ids of the solves removed from it.
+
+    :return: The number of solves deleted.
+    """
+    first_solves = (
+        select(func.min(Solve.id).label("id"))
+        .group_by(Solve.team_id, Solve.challenge_id)
+        .subquery()
+    )
+    duplicates = db.session.execute(
+        select(Solve.id, Solve.team_id, Solve.challenge_id)
+        .where(Solve.id.not_in(select(first_solves.c.id)))
+        .order_by(Solve.team_id, Solve.challenge_id, Solve.id)
+    ).all()
+    if not duplicates:
+        return 0
+
+    removed: Dict[Tuple[int, str], List[int]] = {}
+    for solve_id, team_id, challenge_id in duplicates:
+        removed.setdefault((team_id, challenge_id), []).append(solve_id)
+    db.session.execute(
+        delete(Solve).where(Solve.id.not_in(select(first_solves.c.id)))
+    )
+    db.session.commit()
+
+    print(f"  [!] Removed {len(duplicates)} duplicate solves:")
+    for (team_id, challenge_id), solve_ids in removed.items():
+        print(
+            f"      team {team_id} / challenge {challenge_id}: "
+            f"solve ids {', '.join(map(str, solve_ids))}"
+        )
+    return len(duplicates)
+
+
+UNIQUE_INDEX_CLEANUPS: Dict[str, Callable[[], int]] = {
+    "ux_solve_team_challenge": remove_duplicate_solves,
+}
+"""
+Functions removing the rows that would stop a unique index from being built,
+returning how many they removed.
+"""
+
+
+def upgrade_schema() -> None:
+    """
+    Creates missing tables and indexes. Must be called within an app context.
+
+    Raises `RuntimeError` if a unique index cannot be created, since the code
+    relies on it (e.g. `ON CONFLICT`) and would fail or double count without.
+    """
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+
+    missing_tables = [
+        table.name
+        for table in db.metadata.tables.values()
+        if table.name not in existing_tables
+    ]
+    if missing_tables:
+        print(f"Creating missing tables: {', '.join(missing_tables)}")
+        db.create_all()
+        for table_name, rebuild in DERIVED_TABLES:
+            if table_name in missing_tables:
+                print(f"  Building {table_name} from existing data...")
+                rebuild()
+
+    for table in db.metadata.tables.values():
+        if table.name in missing_tables:
+            continue
+        existing_indexes = {
+            index["name"] for index in inspector.get_indexes(table.name)
+        }
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+            print(f"Creating missing index {index.name} on {table.name}...")
+            cleanup = UNIQUE_INDEX_CLEANUPS.get(index.name)
+            if cleanup is not None and cleanup():
+                print("  Rebuilding derived tables...")
+                for _, rebuild in DERIVED_TABLES:
+                    rebuild()
+            try:
+                index.create(db.engine)
+            except SQLAlchemyError as e:
+                if index.unique:
+                    raise RuntimeError(
+                        f"Could not create unique index {index.name}: {e}"
+                    ) from e
+                print(f"  [!] Could not create index {index.name}: {e}")
@@ -0,0 +1,55 @@
+"""
+Small SQLite files shared by every worker on the host, for state that does not
+belong in the main database (rate limit buckets, cached pages).
+"""
+
+import queue
+import sqlite3
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional, Sequence
+
+
+class SQLiteStore:
+    """
+    A SQLite file with a pool of autocommit connections. Connections are
+    reused across threads and greenlets rather than opened per thread, since a
+    gevent worker runs every request in a greenlet of its own.
+
+    :param schema: Statements run once on every new connection, e.g.
+        `CREATE TABLE IF NOT EXISTS`.
+    """
+
+    def __init__(self, path: str, schema: Sequence[str] = ()) -> None:
+        self.path = path
+        self.schema = schema
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path, timeout=5, isolation_level=None, check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        # Everything kept here can be lost without harm.
+        conn.execute("PRAGMA synchronous=OFF")
+        for statement in self.schema:
+            conn.execute(statement)
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def execute(self, sql: str, parameters: Any = ()) -> Optional[tuple]:
+        """Runs one statement and returns its first row, if any."""
+        with self.connection() as conn:
+            # Read every row so the statement, and its implicit transaction,
+            # is finished before the connection goes back to the pool.
+            rows = conn.execute(sql, parameters).fetchall()
+        return rows[0] if rows else None
@@ -0,0 +1,151 @@
+"""
+Audit log of every flag submission, written off the request path.
+"""
+
+import atexit
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from flask import Flask
+from sqlalchemy import insert
+
+from .extensions import db
+from .models import Submission
+
+MAX_FLAG_LENGTH = 256
+
+
+class SubmissionLog:
+    """
+    Buffers submissions in memory and writes them with one bulk INSERT per
+    batch from a background thread, so `record()` costs the submitting request
+    a queue put instead of a write transaction.
+
+    A batch is written once `batch_size` rows are waiting or `flush_interval`
+    seconds after its first row, whichever is first. The queue holds at most
+    `max_queued` rows; when it is full `record()` waits up to `block_timeout`
+    seconds for room (0 never waits) and then drops the row, counting it in
+    `dropped`. Rows still queued when the process exits are flushed by an
+    `atexit` hook, but a hard kill loses at most one queue's worth.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+        max_queued: int = 10000,
+        block_timeout: float = 0.0,
+    ) -> None:
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        self.written = 0
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queued)
+        self._app: Optional[Flask] = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def init_app(self, app: Flask) -> None:
+        self._app = app
+        atexit.register(self.flush)
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def record(
+        self,
+        challenge_id: str,
+        user_id: int,
+        team_id: Optional[int],
+        flag: str,
+        correct: bool,
+        ip: Optional[str],
+    ) -> None:
+        """Queues one submission. Never touches the database."""
+        self._start()
+        row = {
+            "challenge_id": challenge_id,
+            "user_id": user_id,
+            "team_id": team_id,
+            "flag": flag[:MAX_FLAG_LENGTH],
+            "correct": correct,
+            "ip": ip,
+            "created_at": datetime.utcnow(),
+        }
+        try:
+            if self.block_timeout > 0:
+                self._queue.put(row, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(row)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                if self.dropped % 1000 == 1:
+                    print(f"  [!] Submission log full, {self.dropped} dropped so far")
+
+    def _start(self) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name="submission-log", daemon=True
+                    )
+                    self._thread.start()
+
+    def _take_batch(self, wait: bool) -> List[Dict[str, Any]]:
+        batch: List[Dict[str, Any]] = []
+        try:
+            if wait:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+            else:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            return batch
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if wait and remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        assert self._app is not None
+        with self._app.app_context():
+            try:
+                db.session.execute(insert(Submission), batch)
+                db.session.commit()
+                self.written += len(batch)
+            except Exception as e:
+                db.session.rollback()
+                with self._lock:
+                    self.dropped += len(batch)
+                print(f"  [!] Failed to write {len(batch)} submissions: {e}")
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch(wait=True)
+            if batch:
+                with self._flush_lock:
+                    self._write(batch)
+
+    def flush(self) -> None:
+        """Writes everything queued so far from the calling thread."""
+        if self._app is None:
+            return
+        with self._flush_lock:
+            while batch := self._take_batch(wait=False):
+                self._write(batch)
+
+
+submission_log = SubmissionLog()